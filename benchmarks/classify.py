@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# Classify - StatsGen password classification benchmark
+#
+# This tool is part of PACK (Password Analysis and Cracking Kit)
+#
+# VERSION 0.0.3
+#
+# Copyright (C) 2013 Peter Kacherginsky
+# All rights reserved.
+#
+# Please see the attached LICENSE file for additional licensing information.
+
+import sys, os
+import random, string
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import statsgen
+
+# Characters of the random passwords
+PRINTABLE = string.printable[:94]
+
+def random_passwords(count, seed):
+    """ Generate distinct looking passwords of random printable characters. """
+
+    generator = random.Random(seed)
+    return [''.join([generator.choice(PRINTABLE) for i in xrange(generator.randint(6, 16))]) for j in xrange(count)]
+
+def word_passwords(count, seed):
+    """ Generate passwords made of a lowercase word, sometimes capitalized,
+    followed by optional digits and an exclamation mark. Most of them share
+    their character classes with other passwords. """
+
+    generator = random.Random(seed)
+
+    passwords = list()
+    for i in xrange(count):
+        password = ''.join([generator.choice(string.lowercase) for j in xrange(generator.randint(4, 10))])
+        if generator.random() < 0.2: password = password.capitalize()
+        password += ''.join([generator.choice(string.digits) for j in xrange(generator.choice([0, 0, 1, 2, 2, 4]))])
+        if generator.random() < 0.1: password += '!'
+        passwords.append(password)
+
+    return passwords
+
+def analyze_password_loop(password):
+    """ Reference per-character analysis of the original StatsGen. """
+
+    pass_length = len(password)
+
+    digit = 0
+    lower = 0
+    upper = 0
+    special = 0
+
+    simplemask = list()
+    advancedmask_string = ""
+
+    for letter in password:
+
+        if letter in string.digits:
+            digit += 1
+            advancedmask_string += "?d"
+            if not simplemask or not simplemask[-1] == 'digit': simplemask.append('digit')
+
+        elif letter in string.lowercase:
+            lower += 1
+            advancedmask_string += "?l"
+            if not simplemask or not simplemask[-1] == 'string': simplemask.append('string')
+
+        elif letter in string.uppercase:
+            upper += 1
+            advancedmask_string += "?u"
+            if not simplemask or not simplemask[-1] == 'string': simplemask.append('string')
+
+        else:
+            special += 1
+            advancedmask_string += "?s"
+            if not simplemask or not simplemask[-1] == 'special': simplemask.append('special')
+
+    simplemask_string = ''.join(simplemask) if len(simplemask) <= 3 else 'othermask'
+    charset = statsgen.CHARSETS[(digit > 0, lower > 0, upper > 0, special > 0)]
+
+    return (pass_length, charset, simplemask_string, advancedmask_string, (digit, lower, upper, special))
+
+def best_time(function, repeat):
+    """ Return the best of several timings of a function. """
+
+    timings = list()
+    for i in xrange(repeat):
+        statsgen.ANALYSIS_CACHE.clear()
+        statsgen.ANALYSIS_CACHE_PREVIOUS.clear()
+
+        start = time.time()
+        function()
+        timings.append(time.time() - start)
+
+    return min(timings)
+
+if __name__ == "__main__":
+
+    parser = OptionParser("%prog [options]")
+    parser.add_option("--count", type="int", default=400000, help="Number of passwords in each dataset", metavar="400000")
+    parser.add_option("--batch", type="int", default=100000, help="Number of passwords classified at once", metavar="100000")
+    parser.add_option("--seed", type="int", default=0, help="Random seed of the datasets", metavar="0")
+    parser.add_option("--repeat", type="int", default=3, help="Number of timings to take the best of", metavar="3")
+    (options, args) = parser.parse_args()
+
+    print "[*] Classifying %d passwords per dataset in batches of %d" % (options.count, options.batch)
+
+    for (name, passwords) in [("random", random_passwords(options.count, options.seed)),
+                              ("words", word_passwords(options.count, options.seed))]:
+
+        sg = statsgen.StatsGen()
+        batches = [passwords[i:i+options.batch] for i in xrange(0, len(passwords), options.batch)]
+
+        distinct = len(set(sg.classify_passwords(passwords)))
+
+        loop_time = best_time(lambda: [analyze_password_loop(password) for password in passwords], options.repeat)
+        table_time = best_time(lambda: [sg.analyze_passwords(batch) for batch in batches], options.repeat)
+
+        print "[+] %-7s %7d distinct class strings: loop %.2fs, lookup table %.2fs (%.1fx)" % \
+            (name + ":", distinct, loop_time, table_time, loop_time / table_time)
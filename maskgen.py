@@ -10,18 +10,41 @@
 #
 # Please see the attached LICENSE file for additional licensing information.
 
-import sys
+import sys, os
 import csv
+import json
 import datetime
+import math
+import array
+import itertools
+import multiprocessing
 from operator import itemgetter
 from optparse import OptionParser, OptionGroup
 
+from maskmodel import MaskModel
+
 VERSION = "0.0.3"
 
+# Number of masks around the greedy break point solved exactly in the optimize mode
+OPTIMIZE_CORE_SIZE = 100
+
+# Resolution of mask occurrences in the optimize mode core solver
+OPTIMIZE_CORE_VALUES = 10000
+
+# Mask runtimes are added up in nanoseconds
+RUNTIME_UNIT = 1000000000
+
+# Standard target times reported by the sweep mode
+SWEEP_BREAKPOINTS = [("1 minute", 60), ("1 hour", 60*60), ("1 day", 60*60*24), ("1 week", 60*60*24*7)]
+
 class MaskGen:
     def __init__(self):
-        # Masks collections with meta data
-        self.masks = dict()
+        # Masks collection with meta data stored in parallel arrays
+        self.masks        = list()
+        self.lengths      = array.array('H')
+        self.occurrences  = array.array('L')
+        self.complexities = array.array('d')  # log2 of mask complexity
+        self.times        = array.array('d')  # seconds
 
         self.target_time = None
         self.output_file = None
@@ -35,69 +58,143 @@ class MaskGen:
         self.minoccurrence = None
         self.maxoccurrence = None
 
-        self.customcharset1len = None
-        self.customcharset2len = None
-        self.customcharset3len = None
-        self.customcharset4len = None
+        # Mask parser with lengths of custom charsets
+        self.maskmodel = MaskModel()
 
         # PPS (Passwords per Second) Cracking Speed
         self.pps = 1000000000
+
+        # PPS for each mask length or number of charsets used in a mask
+        self.ppsprofile = None
+        self.ppsprofile_key = "length"
         self.showmasks = False
 
         # Counter for total masks coverage
         self.total_occurrence = 0
 
+        # Number of files loaded in parallel
+        self.threads = 1
+
     def getcomplexity(self, mask):
         """ Return mask complexity. """
-        count = 1
-        for char in mask[1:].split("?"):
-            if char == "l":   count *= 26
-            elif char == "u": count *= 26
-            elif char == "d": count *= 10
-            elif char == "s": count *= 33
-            elif char == "a": count *= 95
-            elif char == "b": count *= 256
-            elif char == "h": count *= 16
-            elif char == "H": count *= 16
-            elif char == "1" and self.customcharset1len: count *= self.customcharset1len
-            elif char == "2" and self.customcharset2len: count *= self.customcharset2len
-            elif char == "3" and self.customcharset3len: count *= self.customcharset3len
-            elif char == "4" and self.customcharset4len: count *= self.customcharset4len
-            else: print "[!] Error, unknown mask ?%s in a mask %s" % (char,mask)
-
-        return count
-
-    def loadmasks(self, filename):
-        """ Load masks and apply filters. """
-        maskReader = csv.reader(open(args[0],'r'), delimiter=',', quotechar='"')
-
-        for (mask,occurrence) in maskReader:
+        return self.maskmodel.getkeyspace(mask)
 
-            if mask == "": continue
+    def loadppsprofile(self, filename):
+        """ Load cracking speed measured for each mask length or number of
+        charsets. The first row names the key column, either 'length' or
+        'charsets', and the following rows contain the key and PPS. """
+
+        with open(filename, 'r') as f:
+            reader = csv.reader(f)
+
+            header = next(reader, None)
+            if not header or not header[0].strip().lower() in ["length", "charsets"]:
+                print "[!] Error, PPS profile must start with a 'length' or 'charsets' column header."
+                return False
+
+            self.ppsprofile_key = header[0].strip().lower()
+            self.ppsprofile = dict()
+
+            for row in reader:
+                if not row or not row[0].strip(): continue
+
+                try:
+                    (key, pps) = (int(row[0]), int(float(row[1])))
+                except (ValueError, IndexError):
+                    print "[!] Error, invalid PPS profile row [%s] in %s." % (",".join(row), filename)
+                    self.ppsprofile = None
+                    return False
 
-            mask_occurrence = int(occurrence)
-            mask_length = len(mask)/2
-            mask_complexity = self.getcomplexity(mask)
-            mask_time = mask_complexity/self.pps
-
-            self.total_occurrence += mask_occurrence
-
-            # Apply filters based on occurrence, length, complexity and time
-            if (self.minoccurrence == None or mask_occurrence >= self.minoccurrence) and \
-               (self.maxoccurrence == None or mask_occurrence <= self.maxoccurrence) and \
-               (self.mincomplexity == None or mask_complexity >= self.mincomplexity) and \
-               (self.maxcomplexity == None or mask_complexity <= self.maxcomplexity) and \
-               (self.mintime == None or mask_time >= self.mintime) and \
-               (self.maxtime == None or mask_time <= self.maxtime) and \
-               (self.maxlength == None or mask_length <= self.maxlength) and \
-               (self.minlength == None or mask_length >= self.minlength):
-
-                self.masks[mask] = dict()
-                self.masks[mask]['length'] = mask_length
-                self.masks[mask]['occurrence'] = mask_occurrence
-                self.masks[mask]['complexity'] = 1 - mask_complexity
-                self.masks[mask]['time'] = mask_time
-                self.masks[mask]['optindex'] = 1 - mask_complexity/mask_occurrence
+                if pps <= 0:
+                    print "[!] Error, PPS of %s %d must be positive in %s." % (self.ppsprofile_key, key, filename)
+                    self.ppsprofile = None
+                    return False
+
+                self.ppsprofile[key] = pps
+
+        if not self.ppsprofile:
+            print "[!] Error, PPS profile %s is empty." % filename
+            return False
+
+        return True
+
+    def getpps(self, mask):
+        """ Return cracking speed of a mask. Speed of the closest mask length or
+        number of charsets is used for values missing in the profile. """
+
+        if not self.ppsprofile:
+            return self.pps
+
+        mask_charsets = self.maskmodel.getcharsets(mask)
+        key = len(mask_charsets) if self.ppsprofile_key == "length" else len(set(mask_charsets))
+
+        if not key in self.ppsprofile:
+            key = min(self.ppsprofile, key=lambda profile_key: (abs(profile_key - key), profile_key))
+
+        return self.ppsprofile[key]
+
+    def getruntime(self, mask, mask_complexity):
+        """ Return mask runtime in RUNTIME_UNIT fractions of a second. """
+        return mask_complexity * RUNTIME_UNIT / self.getpps(mask)
+
+    def loadmasks(self, filenames):
+        """ Load masks from one or more files and apply filters. Occurrences of
+        masks found in several files are added up before filtering. """
+
+        occurrences = dict()
+
+        if self.threads > 1 and len(filenames) > 1:
+            pool = multiprocessing.Pool(min(self.threads, len(filenames)))
+            try:
+                for file_occurrences in pool.imap_unordered(read_masks, filenames):
+                    merge_occurrences(occurrences, file_occurrences)
+                pool.close()
+            except (KeyboardInterrupt, SystemExit):
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            for filename in filenames:
+                merge_occurrences(occurrences, read_masks(filename))
+
+        masks = occurrences.keys()
+        mask_occurrences = [occurrences[mask] for mask in masks]
+        mask_complexities = [self.getcomplexity(mask) for mask in masks]
+        mask_times = [float(self.getruntime(mask, mask_complexity)) / RUNTIME_UNIT for (mask, mask_complexity) in itertools.izip(masks, mask_complexities)]
+        mask_lengths = [len(mask)/2 for mask in masks]
+
+        self.total_occurrence += sum(mask_occurrences)
+
+        # Apply filters based on occurrence, length, complexity and time in whole seconds
+        selected = xrange(len(masks))
+        for (values, minimum, maximum) in [(mask_occurrences, self.minoccurrence, self.maxoccurrence),
+                                           (mask_complexities, self.mincomplexity, self.maxcomplexity),
+                                           ([int(mask_time) for mask_time in mask_times], self.mintime, self.maxtime),
+                                           (mask_lengths, self.minlength, self.maxlength)]:
+            if minimum != None: selected = [i for i in selected if values[i] >= minimum]
+            if maximum != None: selected = [i for i in selected if values[i] <= maximum]
+
+        for i in selected:
+            self.masks.append(masks[i])
+            self.lengths.append(mask_lengths[i])
+            self.occurrences.append(mask_occurrences[i])
+            self.complexities.append(math.log(mask_complexities[i], 2))
+            self.times.append(mask_times[i])
+
+    def sortmasks(self, sorting_mode):
+        """ Return mask numbers sorted by occurrence, complexity or optindex. """
+
+        if sorting_mode == "occurrence":
+            return sorted(xrange(len(self.masks)), key=self.occurrences.__getitem__, reverse=True)
+
+        elif sorting_mode == "complexity":
+            return sorted(xrange(len(self.masks)), key=self.complexities.__getitem__)
+
+        # Mask complexity per occurrence
+        else:
+            optindex = array.array('d', [complexity - math.log(occurrence, 2) if occurrence else float('inf') for (complexity, occurrence) in itertools.izip(self.complexities, self.occurrences)])
+            return sorted(xrange(len(self.masks)), key=optindex.__getitem__)
 
     def generate_masks(self,sorting_mode):
         """ Generate optimal password masks sorted by occurrence, complexity or optindex """
@@ -105,22 +202,20 @@ class MaskGen:
         sample_time = 0
         sample_occurrence = 0
 
-        # TODO Group by time here 1 minutes, 1 hour, 1 day, 1 month, 1 year....
-        #      Group by length   1,2,3,4,5,6,7,8,9,10....
+        # TODO Group by length   1,2,3,4,5,6,7,8,9,10....
         #      Group by occurrence 10%, 20%, 30%, 40%, 50%....
 
         if self.showmasks: print "[L:] Mask:                          [ Occ:  ] [ Time:  ]"
-        for mask in sorted(self.masks.keys(), key=lambda mask: self.masks[mask][sorting_mode], reverse=True):
+        for i in self.sortmasks(sorting_mode):
+            mask = self.masks[i]
 
-            if self.showmasks:
-                time_human = ">1 year" if self.masks[mask]['time'] > 60*60*24*365 else str(datetime.timedelta(seconds=self.masks[mask]['time']))
-                print "[{:>2}] {:<30} [{:<7}] [{:>8}]  ".format(self.masks[mask]['length'], mask, self.masks[mask]['occurrence'], time_human)
+            if self.showmasks: self.printmask(i)
 
             if self.output_file:
                 self.output_file.write("%s\n" % mask)
 
-            sample_occurrence += self.masks[mask]['occurrence']
-            sample_time += self.masks[mask]['time']
+            sample_occurrence += self.occurrences[i]
+            sample_time += self.times[i]
             sample_count += 1
 
             if self.target_time and sample_time > self.target_time:
@@ -130,41 +225,205 @@ class MaskGen:
         print "[*] Finished generating masks:"
         print "    Masks generated: %s" % sample_count
         print "    Masks coverage:  %d%% (%d/%d)" % (sample_occurrence*100/self.total_occurrence,sample_occurrence,self.total_occurrence)
+        time_human = ">1 year" if sample_time > 60*60*24*365 else str(datetime.timedelta(seconds=int(sample_time)))
+        print "    Masks runtime:   %s" % time_human
+
+    def sweep_masks(self, sorting_mode, filename):
+        """ Save cumulative coverage and runtime after each of the sorted masks
+        and display coverage at the standard target times. The curve is saved
+        in the JSON format for .json files and in the CSV format otherwise. """
+
+        curve = list()
+        breakpoints = list()
+
+        sample_count = 0
+        sample_time = 0
+        sample_occurrence = 0
+
+        for i in self.sortmasks(sorting_mode):
+            mask_time = self.times[i]
+
+            # Record the last point within each of the standard target times
+            while len(breakpoints) < len(SWEEP_BREAKPOINTS) and sample_time + mask_time > SWEEP_BREAKPOINTS[len(breakpoints)][1]:
+                breakpoints.append((sample_count, sample_occurrence, sample_time))
+
+            sample_occurrence += self.occurrences[i]
+            sample_time += mask_time
+            sample_count += 1
+
+            curve.append((sample_count, self.masks[i], sample_occurrence, sample_occurrence*100.0/self.total_occurrence, sample_time))
+
+        while len(breakpoints) < len(SWEEP_BREAKPOINTS):
+            breakpoints.append((sample_count, sample_occurrence, sample_time))
+
+        fields = ['masks', 'mask', 'occurrence', 'coverage', 'time']
+
+        with open(filename, 'w') as f:
+            if os.path.splitext(filename)[1].lower() == '.json':
+                sweep = dict()
+                sweep['sorting'] = sorting_mode
+                sweep['total_occurrence'] = self.total_occurrence
+                sweep['curve'] = [dict(zip(fields, point)) for point in curve]
+                sweep['breakpoints'] = [dict(zip(['target_time', 'masks', 'occurrence', 'time'], (target_time,) + point)) for ((name, target_time), point) in zip(SWEEP_BREAKPOINTS, breakpoints)]
+                json.dump(sweep, f, indent=4, sort_keys=True)
+            else:
+                writer = csv.writer(f)
+                writer.writerow(fields)
+                writer.writerows(curve)
+
+        print "[*] Finished sweeping masks:"
+        for ((name, target_time), (sample_count, sample_occurrence, sample_time)) in zip(SWEEP_BREAKPOINTS, breakpoints):
+            print "    %-9s %7d masks, %3d%% (%d/%d), %s" % (name + ":", sample_count, sample_occurrence*100/self.total_occurrence, sample_occurrence, self.total_occurrence, datetime.timedelta(seconds=int(sample_time)))
+
+    def optimize_masks(self):
+        """ Select masks with the best total occurrence within the target time.
+
+        This is a 0-1 knapsack problem where mask runtime is the weight and
+        mask occurrence is the value. Masks are sorted by their occurrence per
+        runtime and added greedily. Masks near the first one that does not fit
+        are then solved exactly with a dynamic programming pass over scaled
+        occurrences, and the remaining time is filled greedily again. The best
+        of this selection, the greedy one and the single best mask is used.
+        """
+
+        budget = self.target_time * RUNTIME_UNIT
+
+        weights = dict()
+        for (i, mask) in enumerate(self.masks):
+            mask_runtime = self.getruntime(mask, self.getcomplexity(mask))
+            if mask_runtime <= budget: weights[i] = mask_runtime
+
+        values = dict((i, self.occurrences[i]) for i in weights)
+
+        # Masks which run in less than a nanosecond always come first
+        masks = sorted(weights, key=lambda mask: (float(values[mask]) / weights[mask] if weights[mask] else float('inf'), values[mask]), reverse=True)
+
+        # Find the first mask which does not fit into the time budget
+        break_index = len(masks)
+        used = 0
+        for (i, mask) in enumerate(masks):
+            if used + weights[mask] > budget:
+                break_index = i
+                break
+            used += weights[mask]
+
+        # Upper bound of coverage by taking a fraction of the break mask
+        bound = sum(values[mask] for mask in masks[:break_index])
+        if break_index < len(masks):
+            mask = masks[break_index]
+            bound += values[mask] * (budget - used) / weights[mask]
+
+        candidates = [greedy_fill(masks, weights, budget)]
+
+        if break_index < len(masks):
+            candidates.append([max(masks, key=values.get)])
+
+            # Solve masks around the break mask exactly
+            core_start = max(0, break_index - OPTIMIZE_CORE_SIZE/2)
+            core_end = min(len(masks), break_index + OPTIMIZE_CORE_SIZE/2)
+
+            selected = masks[:core_start]
+            capacity = budget - sum(weights[mask] for mask in selected)
+
+            core = knapsack(masks[core_start:core_end], weights, values, capacity)
+            selected += core
+            capacity -= sum(weights[mask] for mask in core)
+
+            core = set(core)
+            remaining = [mask for mask in masks[core_start:] if not mask in core]
+            selected += greedy_fill(remaining, weights, capacity)
+
+            candidates.append(selected)
+
+        selected = max(candidates, key=lambda selected: sum(values[mask] for mask in selected))
+
+        sample_count = 0
+        sample_runtime = 0
+        sample_occurrence = 0
+
+        if self.showmasks: print "[L:] Mask:                          [ Occ:  ] [ Time:  ]"
+        order = dict((mask, i) for (i, mask) in enumerate(masks))
+        for i in sorted(selected, key=order.get):
+
+            if self.showmasks: self.printmask(i)
+
+            if self.output_file:
+                self.output_file.write("%s\n" % self.masks[i])
+
+            sample_occurrence += values[i]
+            sample_runtime += weights[i]
+            sample_count += 1
+
+        sample_time = sample_runtime / RUNTIME_UNIT
+
+        print "[*] Finished optimizing masks:"
+        print "    Masks generated: %s" % sample_count
+        print "    Masks coverage:  %d%% (%d/%d)" % (sample_occurrence*100/self.total_occurrence,sample_occurrence,self.total_occurrence)
+        print "    Coverage bound:  %d%% (%d/%d)" % (bound*100/self.total_occurrence,bound,self.total_occurrence)
         time_human = ">1 year" if sample_time > 60*60*24*365 else str(datetime.timedelta(seconds=sample_time))
         print "    Masks runtime:   %s" % time_human
 
+    def printmask(self, i):
+        """ Display mask length, occurrence and runtime. """
+
+        time_human = ">1 year" if self.times[i] > 60*60*24*365 else str(datetime.timedelta(seconds=int(self.times[i])))
+        print "[{:>2}] {:<30} [{:<7}] [{:>8}]  ".format(self.lengths[i], self.masks[i], self.occurrences[i], time_human)
+
     def getmaskscoverage(self, checkmasks):
+        """ Check coverage of masks in the hcmask format. A checked mask covers
+        every loaded mask of the same length where each charset is a subset of
+        the checked mask charset in that position, so ?a?a?a?a covers ?l?d?l?d
+        and ?a?a. Custom charsets known only by their length cover nothing but
+        themselves. Each loaded mask is counted only once. """
 
         sample_count = 0
         sample_occurrence = 0
 
-        total_complexity = 0
+        total_runtime = 0
+
+        # Index loaded masks by length in a trie of their charset ids
+        index = dict()
+        for (i, mask) in enumerate(self.masks):
+            mask_charsets = self.maskmodel.getcharsets(mask)
+            node = index.setdefault(len(mask_charsets), dict())
+            for charset_id in mask_charsets:
+                node = node.setdefault(charset_id, dict())
+            node.setdefault(None, list()).append(i)
 
         if self.showmasks: print "[L:] Mask:                          [ Occ:  ] [ Time:  ]"
         for mask in checkmasks:
             mask = mask.strip()
-            mask_complexity = self.getcomplexity(mask)
+            if not mask or mask.startswith('#'): continue
+
+            (mask_charsets, mask_complexity) = self.maskmodel.parse(mask)
 
-            total_complexity += mask_complexity
+            mask_runtime = self.getruntime(mask, mask_complexity)
+            total_runtime += mask_runtime
 
-            if mask in self.masks:
+            covered = list()
+            if len(mask_charsets) in index:
+                covermasks(index[len(mask_charsets)], mask_charsets, 0, covered, self.maskmodel.issubset)
+
+            if covered:
+                mask_occurrence = sum([self.occurrences[i] for i in covered])
 
                 if self.showmasks:
-                    time_human = ">1 year" if self.masks[mask]['time'] > 60*60*24*365 else str(datetime.timedelta(seconds=self.masks[mask]['time']))
-                    print "[{:>2}] {:<30} [{:<7}] [{:>8}]  ".format(self.masks[mask]['length'], mask, self.masks[mask]['occurrence'], time_human)
+                    mask_time = mask_runtime / RUNTIME_UNIT
+                    time_human = ">1 year" if mask_time > 60*60*24*365 else str(datetime.timedelta(seconds=mask_time))
+                    print "[{:>2}] {:<30} [{:<7}] [{:>8}]  ".format(len(mask_charsets), mask, mask_occurrence, time_human)
 
                 if self.output_file:
                     self.output_file.write("%s\n" % mask)
 
-                sample_occurrence += self.masks[mask]['occurrence']
+                sample_occurrence += mask_occurrence
                 sample_count += 1
 
-            if self.target_time and total_complexity/self.pps > self.target_time:
+            if self.target_time and total_runtime / RUNTIME_UNIT > self.target_time:
                 print "[!] Target time exceeded."
                 break
 
         # TODO: Something wrong here, complexity and time doesn't match with estimated from policygen
-        total_time = total_complexity/self.pps
+        total_time = total_runtime / RUNTIME_UNIT
         time_human = ">1 year" if total_time > 60*60*24*365 else str(datetime.timedelta(seconds=total_time))
         print "[*] Finished matching masks:"
         print "    Masks matched: %s" % sample_count
@@ -172,6 +431,91 @@ class MaskGen:
         print "    Masks runtime:   %s" % time_human
 
 
+def covermasks(node, mask_charsets, position, covered, issubset):
+    """ Remove masks with charsets which are subsets of the mask charsets in
+    each position from the trie and collect them in the covered list. """
+
+    if position == len(mask_charsets):
+        covered.extend(node.pop(None))
+        return
+
+    for charset_id in node.keys():
+        if issubset(charset_id, mask_charsets[position]):
+            child = node[charset_id]
+            covermasks(child, mask_charsets, position + 1, covered, issubset)
+            if not child: del node[charset_id]
+
+def read_masks(filename):
+    """ Read mask occurrences from a statsgen masks file. """
+
+    occurrences = dict()
+
+    with open(filename, 'r') as f:
+        for (mask, occurrence) in csv.reader(f, delimiter=',', quotechar='"'):
+            if mask == "": continue
+            occurrences[mask] = occurrences.get(mask, 0) + int(occurrence)
+
+    return occurrences
+
+def merge_occurrences(occurrences, other):
+    """ Add up mask occurrences from another file. """
+
+    if not occurrences:
+        occurrences.update(other)
+    else:
+        for (mask, occurrence) in other.iteritems():
+            occurrences[mask] = occurrences.get(mask, 0) + occurrence
+
+def greedy_fill(masks, weights, capacity):
+    """ Select masks in the given order skipping the ones which do not fit. """
+
+    selected = list()
+    for mask in masks:
+        if weights[mask] <= capacity:
+            selected.append(mask)
+            capacity -= weights[mask]
+
+    return selected
+
+def knapsack(masks, weights, values, capacity):
+    """ Select masks with the best total value within the capacity. Values are
+    scaled down to OPTIMIZE_CORE_VALUES and the minimum weight for every total
+    value is found with dynamic programming. """
+
+    scale = max(1, sum(values[mask] for mask in masks) / OPTIMIZE_CORE_VALUES)
+    scaled = [values[mask] / scale for mask in masks]
+
+    # Minimum weight of masks reaching each total value
+    best = [0] + [None] * sum(scaled)
+
+    # Total values improved by each of the masks
+    taken = list()
+
+    for (mask, value) in zip(masks, scaled):
+        weight = weights[mask]
+        improved = bytearray(len(best))
+
+        if value:
+            for total in xrange(len(best) - 1, value - 1, -1):
+                previous = best[total - value]
+                if previous != None and previous + weight <= capacity and \
+                   (best[total] == None or previous + weight < best[total]):
+                    best[total] = previous + weight
+                    improved[total] = 1
+
+        taken.append(improved)
+
+    total = max(total for (total, weight) in enumerate(best) if weight != None)
+
+    selected = list()
+    for i in xrange(len(masks) - 1, -1, -1):
+        if taken[i][total]:
+            selected.append(masks[i])
+            total -= scaled[i]
+
+    selected.reverse()
+    return selected
+
 if __name__ == "__main__":
 
     header  = "                       _ \n"
@@ -204,6 +548,8 @@ if __name__ == "__main__":
     sorting.add_option("--optindex",   action="store_true", dest="optindex",   help="sort by mask optindex (default)", default=False)
     sorting.add_option("--occurrence", action="store_true", dest="occurrence", help="sort by mask occurrence",         default=False)
     sorting.add_option("--complexity", action="store_true", dest="complexity", help="sort by mask complexity",         default=False)
+    sorting.add_option("--sweep",      dest="sweep_file", help="save coverage and runtime after each sorted mask", metavar="sweep.csv")
+    sorting.add_option("--optimize",   action="store_true", dest="optimize",   help="select masks with the best coverage within the target time", default=False)
     parser.add_option_group(sorting)
 
     coverage = OptionGroup(parser, "Check mask coverage")
@@ -222,6 +568,8 @@ if __name__ == "__main__":
 
     misc = OptionGroup(parser, "Miscellaneous options")
     misc.add_option("--pps", dest="pps",help="Passwords per Second", type="int", metavar="1000000000")
+    misc.add_option("--pps-profile", dest="ppsprofile", help="Passwords per Second for each mask length or number of charsets (CSV)", metavar="pps.csv")
+    misc.add_option("--threads", dest="threads", help="Parallel processes to use for loading masks files", type="int", default=1, metavar="8")
     misc.add_option("-q", "--quiet", action="store_true", dest="quiet", default=False, help="Don't show headers.")
     parser.add_option_group(misc)
 
@@ -235,7 +583,7 @@ if __name__ == "__main__":
         parser.error("no masks file specified! Please provide statsgen output.")
         exit(1)
 
-    print "[*] Analyzing masks in [%s]" % args[0]
+    print "[*] Analyzing masks in [%s]" % ", ".join(args)
 
     maskgen = MaskGen()
 
@@ -256,20 +604,24 @@ if __name__ == "__main__":
     if options.maxoccurrence: maskgen.maxoccurrence = options.maxoccurrence
 
     # Custom
-    if options.customcharset1len: maskgen.customcharset1len = options.customcharset1len
-    if options.customcharset2len: maskgen.customcharset2len = options.customcharset2len
-    if options.customcharset3len: maskgen.customcharset3len = options.customcharset3len
-    if options.customcharset4len: maskgen.customcharset4len = options.customcharset4len
+    if options.customcharset1len: maskgen.maskmodel.customcharsetlen['1'] = options.customcharset1len
+    if options.customcharset2len: maskgen.maskmodel.customcharsetlen['2'] = options.customcharset2len
+    if options.customcharset3len: maskgen.maskmodel.customcharsetlen['3'] = options.customcharset3len
+    if options.customcharset4len: maskgen.maskmodel.customcharsetlen['4'] = options.customcharset4len
 
     # Misc
     if options.pps: maskgen.pps = options.pps
     if options.showmasks: maskgen.showmasks = options.showmasks
+    if options.threads: maskgen.threads = options.threads
 
-    print "[*] Using {:,d} keys/sec for calculations.".format(maskgen.pps)
+    if options.ppsprofile:
+        if not maskgen.loadppsprofile(options.ppsprofile): sys.exit(1)
+        print "[*] Using keys/sec for each mask %s from [%s] for calculations." % (maskgen.ppsprofile_key, options.ppsprofile)
+    else:
+        print "[*] Using {:,d} keys/sec for calculations.".format(maskgen.pps)
 
     # Load masks
-    for arg in args:
-        maskgen.loadmasks(arg)
+    maskgen.loadmasks(args)
 
     # Matching masks from the command-line
     if options.checkmasks:
@@ -283,6 +635,14 @@ if __name__ == "__main__":
         print "[*] Checking coverage of masks in [%s]" % options.checkmasks_file
         maskgen.getmaskscoverage(checkmasks_file)
 
+    # Selecting the best masks within the target time
+    elif options.optimize:
+        if not maskgen.target_time:
+            parser.error("target time is required to optimize masks.")
+
+        print "[*] Optimizing masks for the target time."
+        maskgen.optimize_masks()
+
     # Printing masks in a file
     else:
         # Process masks according to specified sorting algorithm
@@ -294,4 +654,9 @@ if __name__ == "__main__":
             sorting_mode = "optindex"
 
         print "[*] Sorting masks by their [%s]." % sorting_mode
-        maskgen.generate_masks(sorting_mode)
+
+        if options.sweep_file:
+            print "[*] Saving coverage curve to [%s]" % options.sweep_file
+            maskgen.sweep_masks(sorting_mode, options.sweep_file)
+        else:
+            maskgen.generate_masks(sorting_mode)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# MaskModel - Password mask parsing and keyspace
+#
+# This tool is part of PACK (Password Analysis and Cracking Kit)
+#
+# VERSION 0.0.3
+#
+# Copyright (C) 2013 Peter Kacherginsky
+# All rights reserved.
+#
+# Please see the attached LICENSE file for additional licensing information.
+
+import re
+import string
+
+# Hashcat built-in charsets
+CHARSETS = dict()
+CHARSETS['l'] = string.ascii_lowercase
+CHARSETS['u'] = string.ascii_uppercase
+CHARSETS['d'] = string.digits
+CHARSETS['s'] = " !\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~"
+CHARSETS['a'] = CHARSETS['l'] + CHARSETS['u'] + CHARSETS['d'] + CHARSETS['s']
+CHARSETS['b'] = ''.join(map(chr, range(256)))
+CHARSETS['h'] = "0123456789abcdef"
+CHARSETS['H'] = "0123456789ABCDEF"
+
+# Charset sizes
+CHARSET_SIZES = dict([(char, len(charset)) for (char, charset) in CHARSETS.iteritems()])
+
+# Charsets as bitsets of character codes
+CHARSET_BITS = dict()
+for (char, charset) in CHARSETS.iteritems():
+    CHARSET_BITS[char] = sum([1 << ord(c) for c in charset])
+
+# Custom charsets definitions in hcmask lines are separated by unescaped commas
+HCMASK_SEPARATOR = re.compile(r'(?<!\\),')
+
+# Cache of parsed masks
+MASK_CACHE_SIZE = 100000
+
+class MaskModel:
+    """ Parse masks into tuples of per-position charset ids and cache their
+    keyspace.
+
+    Masks may start with up to four custom charsets in the hcmask format
+    (e.g. ?l?d,?1?1?1?1). Custom charsets ?1 to ?4 without an inline
+    definition use the length in customcharsetlen and have no known
+    characters, so they are told apart by their name.
+    """
+
+    def __init__(self):
+        # Lengths of custom charsets which are not defined in the mask itself
+        self.customcharsetlen = dict()
+
+        # Charset bitsets (None if only the length is known) and sizes by id
+        self.charsets = list()
+        self.sizes = list()
+        self.charset_ids = dict()
+
+        # Whether a charset is a subset of another one by pairs of ids
+        self.subsets = dict()
+
+        self.builtin_ids = dict()
+        for char in CHARSET_BITS:
+            self.builtin_ids[char] = self.getcharsetid(CHARSET_BITS[char], len(CHARSETS[char]))
+
+        self.cache = dict()
+        self.keyspaces = dict()
+
+    def getcharsetid(self, charset_bits, size, name=None):
+        """ Return id of a charset, registering it if necessary. Charsets
+        without known characters (charset_bits is None) are identified by
+        their name. """
+
+        key = (charset_bits if charset_bits != None else name, size)
+
+        if not key in self.charset_ids:
+            self.charset_ids[key] = len(self.charsets)
+            self.charsets.append(charset_bits)
+            self.sizes.append(size)
+
+        return self.charset_ids[key]
+
+    def parse(self, line):
+        """ Return a tuple of charset ids and the keyspace of a mask. """
+
+        if line in self.cache:
+            return self.cache[line]
+
+        mask_charsets = None
+
+        # Plain masks of built-in charsets
+        if line.count('?') * 2 == len(line):
+            try:
+                mask_charsets = tuple([self.builtin_ids[char] for char in line[1::2]])
+            except KeyError:
+                pass
+
+        if mask_charsets == None:
+            fields = [field.replace('\\,', ',') for field in HCMASK_SEPARATOR.split(line)]
+
+            custom = dict()
+            for (i, charset) in enumerate(fields[:-1][:4]):
+                charset_bits = 0
+                for charset_id in self.parsecharsets(charset, dict()):
+                    charset_bits |= self.charsets[charset_id] or 0
+                custom[str(i+1)] = self.getcharsetid(charset_bits, bin(charset_bits).count('1'))
+
+            mask_charsets = self.parsecharsets(fields[-1], custom)
+
+        keyspace = 1
+        for charset_id in mask_charsets:
+            keyspace *= self.sizes[charset_id]
+
+        if len(self.cache) >= MASK_CACHE_SIZE: self.cache.clear()
+        self.cache[line] = (mask_charsets, keyspace)
+
+        return self.cache[line]
+
+    def parsecharsets(self, mask, custom):
+        """ Return a tuple of charset ids for each position of a mask. """
+
+        mask_charsets = list()
+
+        i = 0
+        while i < len(mask):
+            if mask[i] == '?' and i + 1 < len(mask):
+                char = mask[i+1]
+                i += 2
+
+                if char in custom:
+                    mask_charsets.append(custom[char])
+                elif char in self.builtin_ids:
+                    mask_charsets.append(self.builtin_ids[char])
+                elif char == '?':
+                    mask_charsets.append(self.getcharsetid(1 << ord('?'), 1))
+                elif self.customcharsetlen.get(char):
+                    mask_charsets.append(self.getcharsetid(None, self.customcharsetlen[char], '?' + char))
+                else:
+                    print "[!] Error, unknown mask ?%s in a mask %s" % (char,mask)
+                    mask_charsets.append(self.getcharsetid(None, 1, '?' + char))
+
+            # Literal character
+            else:
+                mask_charsets.append(self.getcharsetid(1 << ord(mask[i]), 1))
+                i += 1
+
+        return tuple(mask_charsets)
+
+    def issubset(self, charset_id, other_id):
+        """ Check whether every character of a charset is in another charset.
+        Charsets with unknown characters are only subsets of themselves. """
+
+        if not (charset_id, other_id) in self.subsets:
+            charset_bits = self.charsets[charset_id]
+            other_bits = self.charsets[other_id]
+
+            self.subsets[(charset_id, other_id)] = charset_id == other_id or \
+                (charset_bits != None and other_bits != None and charset_bits & ~other_bits == 0)
+
+        return self.subsets[(charset_id, other_id)]
+
+    def getcharsets(self, line):
+        """ Return a tuple of charset ids of a mask. """
+        return self.parse(line)[0]
+
+    def getkeyspace(self, line):
+        """ Return the number of candidates generated by a mask. Keyspace of
+        plain masks is computed without building their charset ids. """
+
+        if line in self.keyspaces:
+            return self.keyspaces[line]
+
+        # Misplaced ? or unknown charsets end up in the KeyError
+        if line.count('?') * 2 == len(line):
+            try:
+                keyspace = 1
+                for char in line[1::2]:
+                    keyspace *= CHARSET_SIZES[char]
+            except KeyError:
+                keyspace = self.parse(line)[1]
+        else:
+            keyspace = self.parse(line)[1]
+
+        if len(self.keyspaces) >= MASK_CACHE_SIZE: self.keyspaces.clear()
+        self.keyspaces[line] = keyspace
+
+        return keyspace
@@ -10,10 +10,14 @@
 #
 # Please see the attached LICENSE file for additional licensing information.
 
-import sys, string, random
+import sys, os, string, random
 import datetime
 from optparse import OptionParser, OptionGroup
-import itertools
+import math
+import multiprocessing
+import tempfile, shutil
+
+from maskmodel import MaskModel
 
 VERSION = "0.0.2"
 
@@ -36,19 +40,47 @@ class PolicyGen:
         self.pps = 1000000000
         self.showmasks = False
 
+        # Generate masks in the order of increasing complexity
+        self.cheapestfirst = False
+
+        # Number of parallel worker processes
+        self.threads = 1
+
+        # Mask parser
+        self.maskmodel = MaskModel()
+
     def getcomplexity(self, mask):
         """ Return mask complexity. """
-        count = 1
-        for char in mask[1:].split("?"):
-            if char == "l":   count *= 26
-            elif char == "u": count *= 26
-            elif char == "d": count *= 10
-            elif char == "s": count *= 33
-            elif char == "a": count *= 95
-            else: print "[!] Error, unknown mask ?%s in a mask %s" % (char,mask)
-
-        return count
+        return self.maskmodel.getkeyspace(mask)
    
+    def getcompliant(self, lowercount, uppercount, digitcount, specialcount):
+        """ Check whether character counts comply with the password policy. """
+
+        return (self.minlower   == None or lowercount   >= self.minlower) and \
+               (self.maxlower   == None or lowercount   <= self.maxlower) and \
+               (self.minupper   == None or uppercount   >= self.minupper) and \
+               (self.maxupper   == None or uppercount   <= self.maxupper) and \
+               (self.mindigit   == None or digitcount   >= self.mindigit) and \
+               (self.maxdigit   == None or digitcount   <= self.maxdigit) and \
+               (self.minspecial == None or specialcount >= self.minspecial) and \
+               (self.maxspecial == None or specialcount <= self.maxspecial)
+
+    def getcompositions(self, length):
+        """ Generate all (lower, upper, digit, special) character counts of a given length
+        together with the number of distinct masks and the complexity of each mask. """
+
+        for lowercount in xrange(length + 1):
+            for uppercount in xrange(length - lowercount + 1):
+                for digitcount in xrange(length - lowercount - uppercount + 1):
+                    specialcount = length - lowercount - uppercount - digitcount
+
+                    # Multinomial coefficient
+                    mask_count = math.factorial(length) / (math.factorial(lowercount) * math.factorial(uppercount) *
+                                                           math.factorial(digitcount) * math.factorial(specialcount))
+                    mask_complexity = self.getcomplexity('?l'*lowercount + '?u'*uppercount + '?d'*digitcount + '?s'*specialcount)
+
+                    yield (lowercount, uppercount, digitcount, specialcount, mask_count, mask_complexity)
+
     def generate_masks(self, noncompliant):
         """ Generate all possible password masks matching the policy """
 
@@ -60,66 +92,37 @@ class PolicyGen:
         total_complexity = 0
         sample_complexity = 0
 
-        # TODO: Randomize or even statistically arrange matching masks
+        # Character counts of masks matching the policy
+        compositions = list()
+
         for length in xrange(self.minlength, self.maxlength+1):
             print "[*] Generating %d character password masks." % length
-            total_length_count = 0
-            sample_length_count = 0
-
-
-            total_length_complexity = 0
-            sample_length_complexity = 0
-
-            for masklist in itertools.product(['?d','?l','?u','?s'], repeat=length):
 
-                mask = ''.join(masklist)
+            # Count masks and their complexity for each combination of character
+            # counts instead of enumerating all of the 4^length masks
+            for (lowercount, uppercount, digitcount, specialcount, mask_count, mask_complexity) in self.getcompositions(length):
 
-                lowercount = 0
-                uppercount = 0
-                digitcount = 0
-                specialcount = 0
+                total_count += mask_count
+                total_complexity += mask_count * mask_complexity
 
-                mask_complexity = self.getcomplexity(mask)      
-                
-                total_length_count += 1
-                total_length_complexity += mask_complexity
-
-                # Count charachter types in a mask
-                for char in mask[1:].split("?"):
-                    if char == "l": lowercount += 1
-                    elif char == "u": uppercount += 1
-                    elif char == "d": digitcount += 1
-                    elif char == "s": specialcount += 1
-                        
-                # Filter according to password policy
                 # NOTE: Perform exact opposite (XOR) operation if noncompliant
                 #       flag was set when calling the function.
-                if ((self.minlower   == None or lowercount   >= self.minlower) and \
-                    (self.maxlower   == None or lowercount   <= self.maxlower) and \
-                    (self.minupper   == None or uppercount   >= self.minupper) and \
-                    (self.maxupper   == None or uppercount   <= self.maxupper) and \
-                    (self.mindigit   == None or digitcount   >= self.mindigit) and \
-                    (self.maxdigit   == None or digitcount   <= self.maxdigit) and \
-                    (self.minspecial == None or specialcount >= self.minspecial) and \
-                    (self.maxspecial == None or specialcount <= self.maxspecial)) ^ noncompliant :
-
-                    sample_length_count += 1
-                    sample_length_complexity += mask_complexity
-
-                    if self.showmasks:
-                        mask_time = mask_complexity/self.pps      
-                        time_human = ">1 year" if mask_time > 60*60*24*365 else str(datetime.timedelta(seconds=mask_time))
-                        print "[{:>2}] {:<30} [l:{:>2} u:{:>2} d:{:>2} s:{:>2}] [{:>8}]  ".format(length, mask, lowercount,uppercount,digitcount,specialcount, time_human)
+                if self.getcompliant(lowercount, uppercount, digitcount, specialcount) ^ noncompliant:
+                    sample_count += mask_count
+                    sample_complexity += mask_count * mask_complexity
 
-                    if self.output_file:
-                        self.output_file.write("%s\n" % mask)
+                    compositions.append((length, lowercount, uppercount, digitcount, specialcount, mask_complexity))
 
-            total_count += total_length_count
-            sample_count += sample_length_count
-
-            total_complexity += total_length_complexity
-            sample_complexity += sample_length_complexity
+            # Enumerate masks only when they have to be displayed or saved
+            if (self.showmasks or self.output_file) and not self.cheapestfirst:
+                self.write_masks(compositions)
+                compositions = list()
 
+        # All masks with the same character counts have the same complexity
+        if (self.showmasks or self.output_file) and self.cheapestfirst:
+            print "[*] Sorting masks by their complexity."
+            compositions.sort(key=lambda composition: composition[-1])
+            self.write_masks(compositions)
 
         total_time = total_complexity/self.pps
         total_time_human = ">1 year" if total_time > 60*60*24*365 else str(datetime.timedelta(seconds=total_time))
@@ -129,6 +132,93 @@ class PolicyGen:
         sample_time_human = ">1 year" if sample_time > 60*60*24*365 else str(datetime.timedelta(seconds=sample_time))
         print "[*] Policy Masks: %d Time: %s" % (sample_count, sample_time_human)
 
+    def write_masks(self, compositions):
+        """ Display and save all distinct masks for each combination of character counts """
+
+        if self.threads > 1 and self.output_file and not self.showmasks:
+            self.write_masks_parallel(compositions)
+            return
+
+        for (length, lowercount, uppercount, digitcount, specialcount, mask_complexity) in compositions:
+
+            if self.showmasks:
+                mask_time = mask_complexity/self.pps
+                time_human = ">1 year" if mask_time > 60*60*24*365 else str(datetime.timedelta(seconds=mask_time))
+
+            for mask in self.getpermutations(['?d'] * digitcount + ['?l'] * lowercount + ['?u'] * uppercount + ['?s'] * specialcount):
+
+                if self.showmasks:
+                    print "[{:>2}] {:<30} [l:{:>2} u:{:>2} d:{:>2} s:{:>2}] [{:>8}]  ".format(length, mask, lowercount,uppercount,digitcount,specialcount, time_human)
+
+                if self.output_file:
+                    self.output_file.write("%s\n" % mask)
+
+    def write_masks_parallel(self, compositions):
+        """ Save masks using worker processes. Masks are split by their character
+        counts and the leading charset, and each worker writes its own shard file.
+        Shards are concatenated in the same order as masks generated serially. """
+
+        shard_dir = tempfile.mkdtemp(prefix='policygen', dir=os.path.dirname(os.path.abspath(self.output_file.name)))
+
+        shards = list()
+        for (length, lowercount, uppercount, digitcount, specialcount, mask_complexity) in compositions:
+            counts = [digitcount, lowercount, uppercount, specialcount]
+            for (i, charset) in enumerate(['?d', '?l', '?u', '?s']):
+                if not counts[i]: continue
+
+                charsets = ['?d'] * digitcount + ['?l'] * lowercount + ['?u'] * uppercount + ['?s'] * specialcount
+                charsets.remove(charset)
+
+                shard_filename = os.path.join(shard_dir, "%08d.hcmask" % len(shards))
+                shards.append((shard_filename, charset, charsets))
+
+        pool = multiprocessing.Pool(self.threads)
+        try:
+            for shard_filename in pool.imap(mask_worker, shards):
+                with open(shard_filename, 'r') as shard:
+                    shutil.copyfileobj(shard, self.output_file)
+                os.remove(shard_filename)
+            pool.close()
+        except (KeyboardInterrupt, SystemExit):
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            shutil.rmtree(shard_dir)
+
+    def getpermutations(self, charsets):
+        """ Generate distinct permutations of mask charsets in the lexicographic order. """
+
+        # Order charsets the same way as ?d?l?u?s
+        order = ['?d', '?l', '?u', '?s']
+        positions = sorted([order.index(charset) for charset in charsets])
+        length = len(positions)
+
+        while True:
+            yield ''.join([order[position] for position in positions])
+
+            # Find the next permutation in place
+            i = length - 2
+            while i >= 0 and positions[i] >= positions[i+1]: i -= 1
+            if i < 0: break
+
+            j = length - 1
+            while positions[j] <= positions[i]: j -= 1
+
+            positions[i], positions[j] = positions[j], positions[i]
+            positions[i+1:] = positions[:i:-1]
+
+
+def mask_worker(args):
+    """ Save all masks starting with the given charset into a shard file. """
+
+    (shard_filename, prefix, charsets) = args
+
+    with open(shard_filename, 'w') as f:
+        for mask in PolicyGen().getpermutations(charsets):
+            f.write("%s%s\n" % (prefix, mask))
+
+    return shard_filename
 
 if __name__ == "__main__":
 
@@ -147,6 +237,8 @@ if __name__ == "__main__":
     parser.add_option("-o", "--outputmasks", dest="output_masks",help="Save masks to a file", metavar="masks.hcmask")
     parser.add_option("--pps", dest="pps", help="Passwords per Second", type="int", metavar="1000000000")
     parser.add_option("--showmasks", dest="showmasks", help="Show matching masks", action="store_true", default=False)
+    parser.add_option("--threads", dest="threads", help="Parallel processes to use for saving masks", type="int", default=1, metavar="8")
+    parser.add_option("--cheapestfirst", dest="cheapestfirst", help="Generate masks in the order of increasing complexity", action="store_true", default=False)
     parser.add_option("--noncompliant", dest="noncompliant", help="Generate masks for noncompliant passwords", action="store_true", default=False)
 
     group = OptionGroup(parser, "Password Policy", "Define the minimum (or maximum) password strength policy that you would like to test")
@@ -193,6 +285,8 @@ if __name__ == "__main__":
     # Misc
     if options.pps: policygen.pps = options.pps
     if options.showmasks: policygen.showmasks = options.showmasks
+    if options.cheapestfirst: policygen.cheapestfirst = options.cheapestfirst
+    if options.threads: policygen.threads = options.threads
 
     print "[*] Using {:,d} keys/sec for calculations.".format(policygen.pps)
 
@@ -12,25 +12,41 @@
 #
 # Please see the attached LICENSE file for additional licensing information.
 
-import sys
+import sys, os
 import re
 import time
 import operator
+import itertools
+import heapq
 import enchant
 
 from optparse import OptionParser, OptionGroup
 
-from collections import Counter
+from collections import Counter, OrderedDict
+
+import sqlite3
 
 import subprocess
 
 import multiprocessing
 
+from wordlist import WordlistReader
+from wordindex import load_index, levenshtein_distances
+
 VERSION = "0.0.4"
 
 # Testing rules with hashcat --stdout
 HASHCAT_PATH = "hashcat/"
 
+# Number of spell checker suggestions kept in memory by each process
+SUGGESTIONS_CACHE_SIZE = 10000
+
+# Number of new suggestions saved to the persistent cache in one transaction
+SUGGESTIONS_COMMIT_SIZE = 1000
+
+# Number of passwords sent to a worker process at once
+PASSWORDS_BATCH_SIZE = 1000
+
 # Rule Generator class responsible for the complete cycle of rule generation
 class RuleGen:
 
@@ -38,11 +54,20 @@ class RuleGen:
     def __init__(self,language="en",providers="aspell,myspell",basename='analysis',threads=multiprocessing.cpu_count()):
 
         self.threads = threads
+        self.batch_size = PASSWORDS_BATCH_SIZE
 
         self.enchant_broker = enchant.Broker()
         self.enchant_broker.set_ordering("*",providers)
 
         self.enchant = enchant.Dict(language, self.enchant_broker)
+        self.enchant_dictionary = language
+
+        # Spell checker suggestions cache
+        self.suggestions_cache = OrderedDict()
+        self.suggestions_db_file = None
+        self.suggestions_db = None
+        self.suggestions_db_pid = None
+        self.suggestions_db_pending = list()
 
         # Output options
         self.basename = basename
@@ -169,53 +194,35 @@ class RuleGen:
     ############################################################################
     # Calculate Levenshtein edit path matrix
     def levenshtein(self,word,password):
-        matrix = []
-
-        # Generate and populate the initial matrix
-        for i in xrange(len(password) + 1):
-            matrix.append([])
-            for j in xrange(len(word) + 1):
-                if i == 0:
-                    matrix[i].append(j)
-                elif j == 0:
-                    matrix[i].append(i)
-                else:
-                    matrix[i].append(0)
+        """ Calculate Levenshtein edit path matrix with a row for each password
+        prefix and a column for each word prefix. Each row is preallocated and
+        filled from the neighbouring cells kept in local variables. """
+
+        previous_row = range(len(word) + 1)
+        matrix = [previous_row]
 
         # Calculate edit distance for each substring
-        for i in xrange(1,len(password) + 1):
-            for j in xrange(1,len(word) + 1):
-                if password[i-1] == word[j-1]:
-                    matrix[i][j] = matrix[i-1][j-1]
+        for (i, p) in enumerate(password, 1):
+            row = [i] * (len(word) + 1)
+
+            left = i
+            for (j, w, substitution, insertion) in itertools.izip(itertools.count(1), word, previous_row, previous_row[1:]):
+                if p == w:
+                    left = substitution
                 else:
-                    insertion    = matrix[i-1][j] + 1
-                    deletion     = matrix[i][j-1] + 1
-                    substitution = matrix[i-1][j-1] + 1
-                    matrix[i][j] = min(insertion, deletion, substitution)
+                    if insertion < left: left = insertion
+                    if substitution < left: left = substitution
+                    left += 1
+                row[j] = left
+
+            matrix.append(row)
+            previous_row = row
 
         return matrix
 
     def levenshtein_distance(self, s1, s2):
-        """Calculate the Levenshtein distance between two strings.
-
-        This is straight from Wikipedia.
-        """
-        if len(s1) < len(s2):
-            return self.levenshtein_distance(s2, s1)
-        if not s1:
-            return len(s2)
-     
-        previous_row = xrange(len(s2) + 1)
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-     
-        return previous_row[-1]
+        """ Calculate the Levenshtein distance between two strings. """
+        return levenshtein_distances(s1, [s2])[0]
 
     def levenshtein_print(self,matrix,word,password):
         """ Print word X password matrix """
@@ -226,62 +233,199 @@ class RuleGen:
             print " ".join("%2d" % col for col in row)
 
     def generate_levenshtein_rules(self, word, password):
-        """ Generates levenshtein rules. Returns a list of lists of levenshtein rules. """
+        """ Generates levenshtein rules. Returns an iterator of lists of levenshtein rules. """
 
         # 1) Generate Levenshtein matrix
         matrix = self.levenshtein(word, password)
 
-        # 2) Trace reverse paths through the matrix.
-        paths = self.levenshtein_reverse_recursive(matrix,len(matrix)-1,len(matrix[0])-1,0)
+        # 2) Trace reverse paths through the matrix. Paths are built lazily
+        #    as the caller consumes them.
+        return self.levenshtein_reverse_paths(matrix)
+
+    def levenshtein_reverse_moves(self,matrix,i,j):
+        """ Return the moves of reverse paths from a matrix cell in the form
+        (operation, previous_i, previous_j), where operation is None for equal
+        characters. """
+
+        moves = list()
+
+        cost = matrix[i][j]
+
+        # Calculate minimum cost of each operation
+        cost_delete = cost_insert = cost_equal_or_replace = sys.maxint
+        if i > 0: cost_insert = matrix[i-1][j]
+        if j > 0: cost_delete = matrix[i][j-1]
+        if i > 0 and j > 0: cost_equal_or_replace = matrix[i-1][j-1]
+        cost_min = min(cost_delete, cost_insert, cost_equal_or_replace)
 
-        # 3) Return a collection of reverse paths.
-        return [path for path in paths if len(path) <= matrix[-1][-1]]
+        if cost_insert == cost_min:
+            moves.append((('insert',i-1,j),i-1,j))
 
-    def levenshtein_reverse_recursive(self,matrix,i,j,path_len):
+        if cost_delete == cost_min:
+            moves.append((('delete',i,j-1),i,j-1))
+
+        if cost_equal_or_replace == cost_min:
+            if cost_equal_or_replace == cost:
+                moves.append((None,i-1,j-1))
+            else:
+                moves.append((('replace',i-1,j-1),i-1,j-1))
+
+        return moves
+
+    def levenshtein_reverse_paths(self,matrix):
         """ Calculate reverse Levenshtein paths.
-        Recursive, Depth First, Short-circuited algorithm by Peter Kacherginsky
-        Generates a list of edit operations necessary to transform a source word
+        Iterative, Depth First, Short-circuited algorithm by Peter Kacherginsky
+        Generates lists of edit operations necessary to transform a source word
         into a password. Edit operations are recorded in the form:
         (operation, password_offset, word_offset)
         Where an operation can be either insertion, deletion or replacement.
-        """
 
-        if i == 0 and j == 0 or path_len > matrix[-1][-1]:
-            return [[]]
-        else:
-            paths = list()
-
-            cost = matrix[i][j]
-
-            # Calculate minimum cost of each operation
-            cost_delete = cost_insert = cost_equal_or_replace = sys.maxint
-            if i > 0: cost_insert = matrix[i-1][j]
-            if j > 0: cost_delete = matrix[i][j-1]
-            if i > 0 and j > 0: cost_equal_or_replace = matrix[i-1][j-1]
-            cost_min = min(cost_delete, cost_insert, cost_equal_or_replace)
-
-            # Recurse through reverse path for each operation
-            if cost_insert == cost_min:
-                insert_paths = self.levenshtein_reverse_recursive(matrix,i-1,j,path_len+1)
-                for insert_path in insert_paths: paths.append(insert_path + [('insert',i-1,j)])            
-
-            if cost_delete == cost_min:
-                delete_paths = self.levenshtein_reverse_recursive(matrix,i,j-1,path_len+1)
-                for delete_path in delete_paths: paths.append(delete_path + [('delete',i,j-1)])
-
-            if cost_equal_or_replace == cost_min:
-                if cost_equal_or_replace == cost:
-                    equal_paths = self.levenshtein_reverse_recursive(matrix,i-1,j-1,path_len)
-                    for equal_path in equal_paths: paths.append(equal_path)
-                else:
-                    replace_paths = self.levenshtein_reverse_recursive(matrix,i-1,j-1,path_len+1)
-                    for replace_path in replace_paths: paths.append(replace_path + [('replace',i-1,j-1)])
+        The minimum number of operations needed to reach the start of the
+        matrix is calculated once for each cell reachable from its end, so
+        that branches which can not finish within the edit distance are never
+        explored. Paths share
+        their common operations as linked (operation, next) pairs and each
+        path is only built into a list when it is yielded.
+        """
 
-            return paths
+        distance = matrix[-1][-1]
+
+        # Reverse moves of the cells reachable from the end of the matrix
+        moves = {(0, 0): []}
+        cells = [(len(matrix)-1, len(matrix[0])-1)]
+        while cells:
+            (i, j) = cells.pop()
+            if (i, j) in moves: continue
+            moves[(i, j)] = self.levenshtein_reverse_moves(matrix,i,j)
+            cells.extend([(move_i, move_j) for (operation,move_i,move_j) in moves[(i, j)]])
+
+        # Minimum number of operations to reach (0,0) from each of these cells
+        minimum = {(0, 0): 0}
+        for (i, j) in sorted(moves, key=sum)[1:]:
+            minimum[(i, j)] = min([minimum[(move_i, move_j)] + (operation != None) for (operation,move_i,move_j) in moves[(i, j)]])
+
+        # Stack of (i, j, operations count, linked operations)
+        stack = [(len(matrix)-1, len(matrix[0])-1, 0, None)]
+
+        while stack:
+            (i, j, path_len, path) = stack.pop()
+
+            if i == 0 and j == 0:
+                operations = list()
+                while path:
+                    (operation, path) = path
+                    operations.append(operation)
+                yield operations
+                continue
+
+            # Push moves in reverse so that insertions are explored first
+            for (operation,move_i,move_j) in reversed(moves[(i, j)]):
+                if operation == None:
+                    if path_len + minimum[(move_i, move_j)] <= distance:
+                        stack.append((move_i, move_j, path_len, path))
+                elif path_len + 1 + minimum[(move_i, move_j)] <= distance:
+                    stack.append((move_i, move_j, path_len + 1, (operation, path)))
 
     def load_custom_wordlist(self,wordlist_file):
         self.enchant = enchant.request_pwl_dict(wordlist_file)
 
+        # Suggestions change together with the wordlist
+        self.enchant_dictionary = "%s:%d" % (os.path.abspath(wordlist_file), os.path.getmtime(wordlist_file))
+
+    def load_word_index(self,wordlist_file,distance):
+        """ Use a SymSpell index of a custom wordlist instead of Enchant. """
+        self.enchant = load_index(wordlist_file, distance)
+        self.enchant_dictionary = "%s:%d:%d" % (os.path.abspath(wordlist_file), os.path.getmtime(wordlist_file), distance)
+
+    def suggest(self,password):
+        """ Return spell checker suggestions for a password.
+        Suggestions are cached in memory with LRU eviction and, if a database
+        file is specified, in a SQLite database shared by all of the workers
+        and future runs. Cached suggestions are keyed by the spell checker
+        provider, dictionary and the password after preanalysis. """
+
+        if password in self.suggestions_cache:
+            suggestions = self.suggestions_cache.pop(password)
+
+        else:
+            suggestions = None
+
+            db = self.get_suggestions_db()
+            if db:
+                try:
+                    row = db.execute("SELECT suggestions FROM suggestions WHERE provider=? AND dictionary=? AND password=?",
+                                     (self.enchant.provider.name, self.enchant_dictionary, buffer(password))).fetchone()
+                    if row: suggestions = tuple(str(row[0]).split('\n')) if row[0] else tuple()
+
+                # Locked or otherwise unavailable cache falls back to the spell checker
+                except sqlite3.OperationalError, e:
+                    if self.debug: print "[!] Error, suggestions cache lookup failed: %s" % e
+
+            if suggestions == None:
+                suggestions = tuple(self.enchant.suggest(password))
+
+                # New suggestions are saved in a single short transaction so
+                # that workers do not hold the database lock while spell checking
+                if db:
+                    self.suggestions_db_pending.append((self.enchant.provider.name, self.enchant_dictionary, buffer(password), buffer('\n'.join(suggestions))))
+                    if len(self.suggestions_db_pending) >= SUGGESTIONS_COMMIT_SIZE:
+                        self.save_suggestions_db()
+
+            if len(self.suggestions_cache) >= SUGGESTIONS_CACHE_SIZE:
+                self.suggestions_cache.popitem(last=False)
+
+        # Most recently used suggestions are kept at the end
+        self.suggestions_cache[password] = suggestions
+
+        return list(suggestions)
+
+    def get_suggestions_db(self):
+        """ Return a connection to the persistent suggestions cache. Each
+        process opens its own connection. """
+
+        if not self.suggestions_db_file:
+            return None
+
+        if self.suggestions_db_pid != os.getpid():
+            self.suggestions_db_pid = os.getpid()
+            self.suggestions_db_pending = list()
+
+            try:
+                self.suggestions_db = sqlite3.connect(self.suggestions_db_file, timeout=60)
+                self.suggestions_db.execute("PRAGMA journal_mode=WAL")
+                self.suggestions_db.execute("CREATE TABLE IF NOT EXISTS suggestions (provider TEXT, dictionary TEXT, password BLOB, suggestions BLOB, PRIMARY KEY (provider, dictionary, password))")
+                self.suggestions_db.commit()
+
+            # Continue without the persistent cache in this process
+            except sqlite3.OperationalError, e:
+                print "[!] Error, unable to open suggestions cache %s: %s" % (self.suggestions_db_file, e)
+                self.suggestions_db = None
+
+        return self.suggestions_db
+
+    def save_suggestions_db(self):
+        """ Save pending suggestions to the persistent cache. """
+
+        if self.suggestions_db and self.suggestions_db_pending:
+            try:
+                self.suggestions_db.executemany("INSERT OR REPLACE INTO suggestions VALUES (?,?,?,?)", self.suggestions_db_pending)
+                self.suggestions_db.commit()
+            except sqlite3.OperationalError, e:
+                print "[!] Error, unable to save suggestions cache %s: %s" % (self.suggestions_db_file, e)
+                self.suggestions_db.rollback()
+
+        self.suggestions_db_pending = list()
+
+    def close_suggestions_db(self):
+        """ Save pending suggestions and close the persistent cache. """
+
+        if self.suggestions_db and self.suggestions_db_pid == os.getpid():
+            self.save_suggestions_db()
+            self.suggestions_db.close()
+
+        self.suggestions_db = None
+        self.suggestions_db_pid = None
+
     def generate_words(self,password):
         """ Generate source word candidates."""
 
@@ -323,9 +467,10 @@ class RuleGen:
                 print sorted(set(suggestions))
 
 
-            for suggestion in suggestions:
+            # Score all suggestions against the password at once
+            distances = levenshtein_distances(pre_password, suggestions)
 
-                distance = self.levenshtein_distance(suggestion,pre_password)
+            for (suggestion, distance) in zip(suggestions, distances):
 
                 word = dict()
                 word["suggestion"] = suggestion
@@ -372,7 +517,7 @@ class RuleGen:
     def generate_simple_words(self,password):
         """ Generate simple words. A simple spellcheck."""
 
-        return self.enchant.suggest(password)
+        return self.suggest(password)
 
     def generate_advanced_words(self,password):
         """ Generate advanced words.
@@ -401,7 +546,7 @@ class RuleGen:
 
         if self.debug: "[*] Preanalysis Password: %s" % password
 
-        return self.enchant.suggest(password)
+        return self.suggest(password)
 
     ############################################################################
     # Hashcat specific offset definition 0-9,A-Z
@@ -414,7 +559,8 @@ class RuleGen:
         else: return ord(N)-65+10
 
     def generate_hashcat_rules(self, suggestion, password):
-        """ Generate hashcat rules. Returns a length sorted list of lists of hashcat rules."""
+        """ Generate hashcat rules. Returns a length sorted list of at most
+        max_rules lists of hashcat rules."""
 
         # 2) Generate Levenshtein Rules
         lev_rules = self.generate_levenshtein_rules(suggestion, password)
@@ -444,7 +590,11 @@ class RuleGen:
 
         #######################################################################
         # Perform Optimization
-        for hashcat_rule in sorted(hashcat_rules, key=lambda hashcat_rule: len(hashcat_rule)):
+        #
+        # Every reverse path is translated before applying the max_rules cap,
+        # since global rules (e.g. 'u' or 'sa4') may make any of the equally
+        # long paths produce the shortest hashcat rule.
+        for hashcat_rule in heapq.nsmallest(self.max_rules, hashcat_rules, key=lambda hashcat_rule: len(hashcat_rule)):
 
             rule_length = len(hashcat_rule)
 
@@ -748,8 +898,12 @@ class RuleGen:
         else:
             return True
 
-    def analyze_password(self,password, rules_queue=multiprocessing.Queue(), words_queue=multiprocessing.Queue()):
-        """ Analyze a single password. """
+    def analyze_password(self,password, rules_counter=None, words_counter=None):
+        """ Analyze a single password. Generated rules and source words are
+        counted in the optional counters. """
+
+        if rules_counter == None: rules_counter = Counter()
+        if words_counter == None: words_counter = Counter()
 
         if self.verbose: print "[*] Analyzing password: %s" % password
 
@@ -779,16 +933,16 @@ class RuleGen:
                 # Generate a collection of hashcat_rules lists
                 word["hashcat_rules"] = self.generate_hashcat_rules(word["suggestion"],word["password"])
 
-        self.print_hashcat_rules(words, password, rules_queue, words_queue)
+        self.print_hashcat_rules(words, password, rules_counter, words_counter)
 
-    def print_hashcat_rules(self, words, password, rules_queue, words_queue):
+    def print_hashcat_rules(self, words, password, rules_counter, words_counter):
 
         best_found_rule_length = 9999
 
         # Sorted list based on rule length
         for word in sorted(words, key=lambda word: len(word["hashcat_rules"][0])):
 
-            words_queue.put(word["suggestion"])
+            words_counter[word["suggestion"]] += 1
 
             for hashcat_rule in word["hashcat_rules"]:
 
@@ -809,21 +963,31 @@ class RuleGen:
                     hashcat_rule_str = " ".join(hashcat_rule + word["pre_rule"] or [':'])
                     if self.verbose: print "[+] %s => %s => %s" % (word["suggestion"], hashcat_rule_str, password)
 
-                    rules_queue.put(hashcat_rule_str)
-                    
+                    rules_counter[hashcat_rule_str] += 1
 
     def password_worker(self,i, passwords_queue, rules_queue, words_queue):
+        """ Worker to analyze batches of passwords. Rules and words generated
+        for each batch are counted and sent to the writers at once. """
         if self.debug: print "[*] Password analysis worker [%d] started." % i
         try:
             while True:
-                password = passwords_queue.get()
+                passwords = passwords_queue.get()
 
                 # Interrupted by a Death Pill
-                if password == None: break
+                if passwords == None: break
 
-                self.analyze_password(password, rules_queue, words_queue)
+                rules_counter = Counter()
+                words_counter = Counter()
+
+                for password in passwords:
+                    self.analyze_password(password, rules_counter, words_counter)
+
+                if rules_counter: rules_queue.put(rules_counter.items())
+                if words_counter: words_queue.put(words_counter.items())
         except (KeyboardInterrupt, SystemExit):
             if self.debug: print "[*] Password analysis worker [%d] terminated." % i
+        finally:
+            self.close_suggestions_db()
 
         if self.debug: print "[*] Password analysis worker [%d] stopped." % i
 
@@ -835,12 +999,13 @@ class RuleGen:
         if self.debug: print "[*] Rule worker started."
         try:
             while True:
-                rule = rules_queue.get()
+                rules = rules_queue.get()
 
                 # Interrupted by a Death Pill
-                if rule == None: break
+                if rules == None: break
 
-                f.write("%s\n" % rule)
+                for (rule, count) in rules:
+                    f.write(("%s\n" % rule) * count)
                 f.flush()
 
         except (KeyboardInterrupt, SystemExit):
@@ -857,12 +1022,13 @@ class RuleGen:
         if self.debug: print "[*] Word worker started."
         try:
             while True:
-                word = words_queue.get()
+                words = words_queue.get()
 
                 # Interrupted by a Death Pill
-                if word == None: break
+                if words == None: break
 
-                f.write("%s\n" % word)
+                for (word, count) in words:
+                    f.write(("%s\n" % word) * count)
                 f.flush()
 
         except (KeyboardInterrupt, SystemExit):
@@ -878,59 +1044,70 @@ class RuleGen:
         print "[*] Analyzing passwords file: %s:" % passwords_file
         print "[*] Press Ctrl-C to end execution and generate statistical analysis."
 
-        # Setup queues
-        passwords_queue = multiprocessing.Queue(self.threads)
+        # Setup queues. Each worker may have a second batch of passwords
+        # waiting while it analyzes the current one.
+        passwords_queue = multiprocessing.Queue(2 * self.threads)
         rules_queue = multiprocessing.Queue()
         words_queue = multiprocessing.Queue()
 
         # Start workers
+        password_workers = list()
         for i in range(self.threads):
-            multiprocessing.Process(target=self.password_worker, args=(i, passwords_queue, rules_queue, words_queue)).start()
-        multiprocessing.Process(target=self.rule_worker, args=(rules_queue, "%s.rule" % self.basename)).start()
-        multiprocessing.Process(target=self.word_worker, args=(words_queue, "%s.word" % self.basename)).start()
+            password_worker = multiprocessing.Process(target=self.password_worker, args=(i, passwords_queue, rules_queue, words_queue))
+            password_worker.start()
+            password_workers.append(password_worker)
 
-        # Continue with the main thread
+        rule_worker = multiprocessing.Process(target=self.rule_worker, args=(rules_queue, "%s.rule" % self.basename))
+        rule_worker.start()
+        word_worker = multiprocessing.Process(target=self.word_worker, args=(words_queue, "%s.word" % self.basename))
+        word_worker.start()
 
-        f = open(passwords_file,'r')
+        # Continue with the main thread
 
         password_count = 0
         analysis_start = time.time()
         segment_start = analysis_start
+        passwords = list()
         try:        
-            for password in f:
-                password = password.rstrip('\r\n')
-                if len(password) > 0:
+            for password in WordlistReader(passwords_file):
 
-                    # Provide analysis time feedback to the user
-                    if not self.quiet and password_count != 0 and password_count % 5000 == 0:
-                        segment_time = time.time() - segment_start
-                        print "[*] Processed %d passwords in %.2f seconds at the rate of %.2f p/sec" % \
-                            (password_count, segment_start - analysis_start, 5000/segment_time )
-                        segment_start = time.time()
+                # Provide analysis time feedback to the user
+                if not self.quiet and password_count != 0 and password_count % 5000 == 0:
+                    segment_time = time.time() - segment_start
+                    print "[*] Processed %d passwords in %.2f seconds at the rate of %.2f p/sec" % \
+                        (password_count, segment_start - analysis_start, 5000/segment_time )
+                    segment_start = time.time()
 
-                    password_count += 1
+                password_count += 1
 
-                    # Perform preliminary checks and add password to the queue
-                    if self.check_reversible_password(password):
-                        passwords_queue.put(password)
+                # Perform preliminary checks and add password to the queue
+                if self.check_reversible_password(password):
+                    passwords.append(password)
+
+                    if len(passwords) >= self.batch_size:
+                        passwords_queue.put(passwords)
+                        passwords = list()
 
         except (KeyboardInterrupt, SystemExit):
             print "\n[!] Rulegen was interrupted."
 
         else:
+            # Queue the last partial batch.
+            if passwords: passwords_queue.put(passwords)
+
             # Signal workers to stop.
             for i in range(self.threads):
                 passwords_queue.put(None) 
 
-           # Wait for all of the queued passwords to finish.
-            while not passwords_queue.empty():
-                time.sleep(1)
+            # Wait for all of the queued passwords to finish.
+            for password_worker in password_workers:
+                password_worker.join()
 
-            # Signal writers to stop.
+            # Signal writers to stop and wait for them to save the results.
             rules_queue.put(None)
             words_queue.put(None)
-
-        f.close()
+            rule_worker.join()
+            word_worker.join()
 
         analysis_time = time.time() - analysis_start
         print "[*] Finished processing %d passwords in %.2f seconds at the rate of %.2f p/sec" % (password_count, analysis_time, float(password_count)/analysis_time )
@@ -1017,6 +1194,7 @@ if __name__ == "__main__":
     parser.add_option("-w","--wordlist", help="Use a custom wordlist for rule analysis.", metavar="wiki.dict")
     parser.add_option("-q", "--quiet", action="store_true", dest="quiet", default=False, help="Don't show headers.")
     parser.add_option("--threads", type="int", default=multiprocessing.cpu_count(), help="Parallel threads to use for processing.")
+    parser.add_option("--batch", type="int", default=PASSWORDS_BATCH_SIZE, help="Number of passwords sent to a thread at once.", metavar=str(PASSWORDS_BATCH_SIZE))
 
     wordtune = OptionGroup(parser, "Fine tune source word generation:")
     wordtune.add_option("--maxworddist", help="Maximum word edit distance (Levenshtein)", type="int", default=10, metavar="10")
@@ -1027,7 +1205,7 @@ if __name__ == "__main__":
 
     ruletune = OptionGroup(parser, "Fine tune rule generation:")
     ruletune.add_option("--maxrulelen", help="Maximum number of operations in a single rule", type="int", default=10, metavar="10")
-    ruletune.add_option("--maxrules", help="Maximum number of rules to consider", type="int", default=5, metavar="5")
+    ruletune.add_option("--maxrules", help="Maximum number of shortest rules to keep per source word", type="int", default=5, metavar="5")
     ruletune.add_option("--morerules", help="Generate suboptimal rules", action="store_true", default=False)
     ruletune.add_option("--simplerules", help="Generate simple rules insert,delete,replace",action="store_true", default=False)
     ruletune.add_option("--bruterules", help="Bruteforce reversal and rotation rules (slow)",action="store_true", default=False)
@@ -1035,6 +1213,9 @@ if __name__ == "__main__":
 
     spelltune = OptionGroup(parser, "Fine tune spell checker engine:")
     spelltune.add_option("--providers", help="Comma-separated list of provider engines", default="aspell,myspell", metavar="aspell,myspell")
+    spelltune.add_option("--index", help="Use a built-in index of the custom wordlist instead of Enchant", action="store_true", default=False)
+    spelltune.add_option("--indexdist", help="Maximum edit distance of words suggested by the index", type="int", default=2, metavar="2")
+    spelltune.add_option("--cache", help="Save spell checker suggestions in a SQLite database for reuse", metavar="suggestions.db")
     parser.add_option_group(spelltune)
 
     debug = OptionGroup(parser, "Debuggin options:")
@@ -1055,7 +1236,11 @@ if __name__ == "__main__":
         parser.error("no passwords file specified")
         exit(1)
 
+    if options.index and not options.wordlist:
+        parser.error("--index requires --wordlist")
+
     rulegen = RuleGen(language="en", providers=options.providers, basename=options.basename, threads=options.threads)
+    rulegen.batch_size = options.batch
 
     # Finetuning word generation
     rulegen.max_word_dist=options.maxworddist
@@ -1078,14 +1263,23 @@ if __name__ == "__main__":
     rulegen.hashcat = options.hashcat
     rulegen.quiet = options.quiet
 
+    # Persistent spell checker suggestions cache
+    rulegen.suggestions_db_file = options.cache
+
     # Custom wordlist
     if not options.word:
-        if options.wordlist: rulegen.load_custom_wordlist(options.wordlist)
-        print "[*] Using Enchant '%s' module. For best results please install" % rulegen.enchant.provider.name
-        print "    '%s' module language dictionaries." % rulegen.enchant.provider.name
+        if options.index: rulegen.load_word_index(options.wordlist, options.indexdist)
+        elif options.wordlist: rulegen.load_custom_wordlist(options.wordlist)
+
+        if options.index:
+            print "[*] Using word index of [%s] with maximum distance %d." % (options.wordlist, options.indexdist)
+        else:
+            print "[*] Using Enchant '%s' module. For best results please install" % rulegen.enchant.provider.name
+            print "    '%s' module language dictionaries." % rulegen.enchant.provider.name
 
     # Analyze a single password or several passwords in a file
     if options.password: 
         rulegen.analyze_password(args[0])
+        rulegen.close_suggestions_db()
     else:
         rulegen.analyze_passwords_file(args[0])
@@ -10,13 +10,259 @@
 #
 # Please see the attached LICENSE file for additional licensing information.
 
-import sys
+import sys, os
 import re, operator, string
 from optparse import OptionParser, OptionGroup
-import time
+import time, datetime
+import itertools
+import json
+import struct, zlib
+import heapq
+import collections
+import array, tempfile, shutil, zipfile
+import multiprocessing
+
+from wordlist import WordlistReader, decode_hex
 
 VERSION = "0.0.3"
 
+# Character class lookup table. Digits, lowercase, uppercase and special
+# characters are translated to 'd', 'l', 'u' and 's'. Newlines separate
+# passwords in a batch and are preserved.
+CLASS_TABLE = ''.join(['\n' if chr(c) == '\n'        else
+                       'd'  if chr(c) in string.digits    else
+                       'l'  if chr(c) in string.lowercase else
+                       'u'  if chr(c) in string.uppercase else
+                       's' for c in xrange(256)])
+
+# Pre-counted input lines such as "uniq -c" output: "   42 password"
+COUNTED_LINE = re.compile(r'^\s*(\d+)[ \t](.*)$')
+
+# Size of the .npy header reserved in front of exported columns
+NPY_HEADER_SIZE = 128
+
+# Minimum number of seconds between progress reports
+PROGRESS_INTERVAL = 5
+
+# StatsGen settings copied to worker processes
+WORKER_SETTINGS = ['minlength', 'maxlength', 'charsets', 'simplemasks', 'approx', 'counted']
+
+# Statistics snapshot file format. Version 2 added the Space-Saving summary
+# size and errors of approximately counted advanced masks.
+SNAPSHOT_MAGIC = "PACKSTAT"
+SNAPSHOT_VERSION = 2
+
+# Cache of analyzed character class strings. When the cache is full it
+# becomes the previous generation, and its entries which are still in use
+# move back to the current one.
+ANALYSIS_CACHE = dict()
+ANALYSIS_CACHE_PREVIOUS = dict()
+ANALYSIS_CACHE_SIZE = 100000
+
+# Simple masks treat lowercase and uppercase characters as a single string
+SIMPLE_TABLE = string.maketrans('lu', 'aa')
+
+SIMPLEMASKS = {'': ''}
+for length in xrange(1, 4):
+    for simplemask in itertools.product('das', repeat=length):
+        if not [i for i in xrange(1, length) if simplemask[i] == simplemask[i-1]]:
+            SIMPLEMASKS[''.join(simplemask)] = ''.join([{'d': 'digit', 'a': 'string', 's': 'special'}[c] for c in simplemask])
+
+# Character-sets indexed by the presence of (digit, lower, upper, special) characters
+CHARSETS = dict()
+for (digit, lower, upper, special) in itertools.product([False, True], repeat=4):
+    if   digit and not lower and not upper and not special: charset = 'numeric'
+    elif not digit and lower and not upper and not special: charset = 'loweralpha'
+    elif not digit and not lower and upper and not special: charset = 'upperalpha'
+    elif not digit and not lower and not upper and special: charset = 'special'
+
+    elif not digit and lower and upper and not special:     charset = 'mixedalpha'
+    elif digit and lower and not upper and not special:     charset = 'loweralphanum'
+    elif digit and not lower and upper and not special:     charset = 'upperalphanum'
+    elif not digit and lower and not upper and special:     charset = 'loweralphaspecial'
+    elif not digit and not lower and upper and special:     charset = 'upperalphaspecial'
+    elif digit and not lower and not upper and special:     charset = 'specialnum'
+
+    elif not digit and lower and upper and special:         charset = 'mixedalphaspecial'
+    elif digit and not lower and upper and special:         charset = 'upperalphaspecialnum'
+    elif digit and lower and not upper and special:         charset = 'loweralphaspecialnum'
+    elif digit and lower and upper and not special:         charset = 'mixedalphanum'
+    else:                                                   charset = 'all'
+
+    CHARSETS[(digit, lower, upper, special)] = charset
+
+class SpaceSaving:
+    """ Space-Saving summary of the most frequent items in a stream.
+
+    At most `size` items are tracked in constant memory. Once the summary is
+    full, a new item replaces the least frequent one and inherits its count
+    as the error. Therefore, reported counts never underestimate the actual
+    count and overestimate it by at most N/size, where N is the total count
+    of all updates. Any item occurring more than N/size times is guaranteed
+    to be tracked. Merging summaries adds up their error bounds.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.counts = dict()
+        self.errors = dict()
+
+        # Heap of (count, item) pairs. Counts in the heap may lag behind the
+        # actual counts, so they are refreshed lazily when looking for the minimum.
+        self.heap = list()
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, item):
+        return item in self.counts
+
+    def iteritems(self):
+        return self.counts.iteritems()
+
+    def update(self, item, count=1):
+        """ Add count occurrences of the item. """
+
+        if item in self.counts:
+            self.counts[item] += count
+
+        elif len(self.counts) < self.size:
+            self.counts[item] = count
+            self.errors[item] = 0
+            heapq.heappush(self.heap, (count, item))
+
+        else:
+            # Find the least frequent item refreshing outdated heap entries
+            while True:
+                (min_count, min_item) = self.heap[0]
+                if self.counts[min_item] == min_count: break
+                heapq.heapreplace(self.heap, (self.counts[min_item], min_item))
+
+            del self.counts[min_item]
+            del self.errors[min_item]
+
+            self.counts[item] = min_count + count
+            self.errors[item] = min_count
+            heapq.heapreplace(self.heap, (min_count + count, item))
+
+    def merge(self, other):
+        """ Merge another Space-Saving summary. """
+
+        for (item, count) in other.counts.iteritems():
+            self.update(item, count)
+            self.errors[item] += other.errors[item]
+
+    def restore(self, counts, errors):
+        """ Restore tracked items with their counts and errors. """
+
+        self.counts = counts
+        self.errors = errors
+        self.heap = [(count, item) for (item, count) in counts.iteritems()]
+        heapq.heapify(self.heap)
+
+    def max_error(self):
+        """ Return the maximum overestimation of any reported count. """
+
+        return max(self.errors.values()) if self.errors else 0
+
+class FeatureExport:
+    """ Export per-password features into a NumPy .npz archive.
+
+    Every analyzed password gets a row in the length, digit, lower, upper,
+    special, charset, simplemask and advancedmask columns (and count for
+    pre-counted input). Masks and character-sets are dictionary encoded:
+    the charset, simplemask and advancedmask columns store indexes into the
+    charsets, simplemasks and advancedmasks arrays. Lengths and character
+    counts saturate at 65535.
+
+    Columns are streamed to temporary files and packed into the archive on
+    close, so the export does not depend on NumPy itself.
+    """
+
+    def __init__(self, filename, counted=False):
+        self.filename = filename
+
+        self.columns = [('length', 'H'), ('digit', 'H'), ('lower', 'H'), ('upper', 'H'), ('special', 'H'),
+                        ('charset', 'B'), ('simplemask', 'B'), ('advancedmask', 'I')]
+        if counted: self.columns.append(('count', 'I'))
+
+        self.rows = 0
+        self.tempdir = tempfile.mkdtemp(prefix='statsgen')
+        self.files = dict()
+        for (name, typecode) in self.columns:
+            self.files[name] = open(os.path.join(self.tempdir, "%s.npy" % name), 'wb')
+            self.files[name].write(' ' * NPY_HEADER_SIZE)
+
+        # Dictionaries and per-mask features indexed by character class strings
+        self.charsets = list()
+        self.simplemasks = list()
+        self.advancedmasks = list()
+        self.masks_index = dict()
+        self.masks_features = dict((name, list()) for (name, typecode) in self.columns[:7])
+
+    def write(self, analyze_classes, classes, counts=None):
+        """ Append features of a batch of passwords given their character class strings. """
+
+        for password_classes in classes:
+            if not password_classes in self.masks_index:
+                self.add_mask(password_classes, analyze_classes(password_classes))
+
+        ids = [self.masks_index[password_classes] for password_classes in classes]
+
+        for (name, typecode) in self.columns:
+            if name == 'advancedmask':
+                values = array.array(typecode, ids)
+            elif name == 'count':
+                values = array.array(typecode, counts)
+            else:
+                features = self.masks_features[name]
+                values = array.array(typecode, [features[i] for i in ids])
+
+            if sys.byteorder == 'big': values.byteswap()
+            values.tofile(self.files[name])
+
+        self.rows += len(ids)
+
+    def add_mask(self, password_classes, analysis):
+        """ Add a new advanced mask and its features to the dictionaries. """
+
+        (pass_length, characterset, simplemask, advancedmask, policy) = analysis
+
+        if not characterset in self.charsets: self.charsets.append(characterset)
+        if not simplemask in self.simplemasks: self.simplemasks.append(simplemask)
+
+        features = [pass_length] + list(policy)
+        for (name, value) in zip(['length', 'digit', 'lower', 'upper', 'special'], features):
+            self.masks_features[name].append(min(value, 65535))
+
+        self.masks_features['charset'].append(self.charsets.index(characterset))
+        self.masks_features['simplemask'].append(self.simplemasks.index(simplemask))
+
+        self.masks_index[password_classes] = len(self.advancedmasks)
+        self.advancedmasks.append(advancedmask)
+
+    def close(self):
+        """ Pack all of the columns and dictionaries into the .npz archive. """
+
+        try:
+            archive = zipfile.ZipFile(self.filename, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+            for (name, typecode) in self.columns:
+                f = self.files[name]
+                f.seek(0)
+                f.write(npy_header("<u%d" % array.array(typecode).itemsize, self.rows))
+                f.close()
+                archive.write(f.name, "%s.npy" % name)
+
+            for (name, values) in [('charsets', self.charsets), ('simplemasks', self.simplemasks), ('advancedmasks', self.advancedmasks)]:
+                width = max([len(value) for value in values] + [1])
+                data = ''.join([value.ljust(width, '\0') for value in values])
+                archive.writestr("%s.npy" % name, npy_header("|S%d" % width, len(values)) + data)
+
+            archive.close()
+        finally:
+            shutil.rmtree(self.tempdir)
+
 class StatsGen:
     def __init__(self):
         self.output_file = None
@@ -29,18 +275,41 @@ class StatsGen:
         self.quiet = False
         self.debug = True
 
+        # Number of parallel worker processes
+        self.threads = 1
+
         # Stats dictionaries
         self.stats_length = dict()
         self.stats_simplemasks = dict()
         self.stats_advancedmasks = dict()
         self.stats_charactersets = dict()
 
+        # Track advanced masks approximately using a summary of this size
+        self.approx = None
+
+        # Input lines are prefixed with password counts
+        self.counted = False
+
+        # Export per-password features
+        self.export = None
+
         # Ignore stats with less than 1% coverage
         self.hiderare = False
 
         self.filter_counter = 0
         self.total_counter = 0
 
+        # Progress and profiling
+        self.progress = False
+        self.progress_time = 0
+        self.start_time = None
+        self.start_counter = 0
+        self.analysis_time = 0
+        self.bytes_counter = 0
+
+        # Time spent reading, classifying and updating statistics (summed over workers)
+        self.timings = {'read': 0.0, 'classify': 0.0, 'update': 0.0}
+
         # Minimum password complexity counters
         self.mindigit   = None
         self.minupper   = None
@@ -53,124 +322,383 @@ class StatsGen:
         self.maxspecial = None
 
     def analyze_password(self, password):
+        """ Analyze a single password. """
+
+        return self.analyze_classes(password.translate(CLASS_TABLE).replace('\n', 's'))
+
+    def analyze_passwords(self, passwords):
+        """ Analyze a batch of passwords. """
+
+        return [self.analyze_classes(password_classes) for password_classes in self.classify_passwords(passwords)]
+
+    def classify_passwords(self, passwords):
+        """ Translate a batch of passwords into character class strings at once. """
+
+        classes = '\n'.join(passwords).translate(CLASS_TABLE).split('\n')
 
-        # Password length
-        pass_length = len(password)
+        # Decoded $HEX[] passwords may contain newlines themselves
+        if len(classes) != len(passwords):
+            classes = [password.translate(CLASS_TABLE).replace('\n', 's') for password in passwords]
 
-        # Character-set and policy counters
-        digit = 0
-        lower = 0
-        upper = 0
-        special = 0
+        return classes
 
-        simplemask = list()
-        advancedmask_string = ""
+    def analyze_classes(self, password_classes):
+        """ Analyze a character class string produced by the lookup table.
+        Passwords with identical character classes share all of the statistics,
+        so the results are cached. """
+        global ANALYSIS_CACHE, ANALYSIS_CACHE_PREVIOUS
 
-        # Detect simple and advanced masks
-        for letter in password:
- 
-            if letter in string.digits:
-                digit += 1
-                advancedmask_string += "?d"
-                if not simplemask or not simplemask[-1] == 'digit': simplemask.append('digit')
+        analysis = ANALYSIS_CACHE.get(password_classes)
+        if analysis: return analysis
 
-            elif letter in string.lowercase:
-                lower += 1
-                advancedmask_string += "?l"
-                if not simplemask or not simplemask[-1] == 'string': simplemask.append('string')
+        analysis = ANALYSIS_CACHE_PREVIOUS.get(password_classes)
+        if not analysis:
+            analysis = analyze_class_string(password_classes)
 
+        if len(ANALYSIS_CACHE) >= ANALYSIS_CACHE_SIZE:
+            ANALYSIS_CACHE_PREVIOUS = ANALYSIS_CACHE
+            ANALYSIS_CACHE = dict()
+        ANALYSIS_CACHE[password_classes] = analysis
 
-            elif letter in string.uppercase:
-                upper += 1
-                advancedmask_string += "?u"
-                if not simplemask or not simplemask[-1] == 'string': simplemask.append('string')
+        return analysis
+
+    def generate_stats(self, filename):
+        """ Generate password statistics. """
+
+        self.start_time = time.time()
+        self.start_counter = self.total_counter
+
+        if self.threads > 1:
+            self.generate_stats_parallel(filename)
+        else:
+            self.generate_stats_range(filename)
+
+        self.analysis_time = time.time() - self.start_time
+
+    def generate_stats_parallel(self, filename):
+        """ Analyze the passwords file in worker processes. Plain files are split
+        into byte ranges, while streamed passwords are dispatched in batches. """
+
+        settings = dict((name, getattr(self, name)) for name in WORKER_SETTINGS)
+
+        pool = multiprocessing.Pool(self.threads)
+        try:
+            reader = WordlistReader(filename)
+
+            if reader.seekable():
+                filesize = os.path.getsize(filename)
+
+                # Use several chunks per worker to keep all of them busy until the end
+                chunk_count = self.threads * 4
+                chunk_size = max(filesize / chunk_count + 1, 1024*1024)
+
+                chunks = [(settings, filename, start, min(start + chunk_size, filesize)) for start in xrange(0, filesize, chunk_size)]
+
+                # Merge results in the chunk order so that the output is deterministic
+                for worker_stats in pool.imap(stats_worker, chunks):
+                    self.merge_stats(worker_stats)
+                    if self.progress: self.print_progress(self.bytes_counter, filesize)
 
             else:
-                special += 1
-                advancedmask_string += "?s"
-                if not simplemask or not simplemask[-1] == 'special': simplemask.append('special')
+                # Limit the number of batches in flight to bound memory usage
+                pending = collections.deque()
+                batches = reader.batches()
+                while True:
+                    read_start = time.time()
+                    passwords = next(batches, None)
+                    self.timings['read'] += time.time() - read_start
 
+                    if passwords == None: break
 
-        # String representation of masks
-        simplemask_string = ''.join(simplemask) if len(simplemask) <= 3 else 'othermask'
+                    pending.append(pool.apply_async(stats_batch_worker, [(settings, passwords)]))
+                    if len(pending) > self.threads * 2:
+                        self.merge_stats(pending.popleft().get())
+                        if self.progress: self.print_progress(reader.position)
 
-        # Policy
-        policy = (digit,lower,upper,special)
+                while pending:
+                    self.merge_stats(pending.popleft().get())
 
-        # Determine character-set
-        if   digit and not lower and not upper and not special: charset = 'numeric'
-        elif not digit and lower and not upper and not special: charset = 'loweralpha'
-        elif not digit and not lower and upper and not special: charset = 'upperalpha'
-        elif not digit and not lower and not upper and special: charset = 'special'
+                self.bytes_counter = reader.position
 
-        elif not digit and lower and upper and not special:     charset = 'mixedalpha'
-        elif digit and lower and not upper and not special:     charset = 'loweralphanum'
-        elif digit and not lower and upper and not special:     charset = 'upperalphanum'
-        elif not digit and lower and not upper and special:     charset = 'loweralphaspecial'
-        elif not digit and not lower and upper and special:     charset = 'upperalphaspecial'
-        elif digit and not lower and not upper and special:     charset = 'specialnum'
+            pool.close()
+        except (KeyboardInterrupt, SystemExit):
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
 
-        elif not digit and lower and upper and special:         charset = 'mixedalphaspecial'
-        elif digit and not lower and upper and special:         charset = 'upperalphaspecialnum'
-        elif digit and lower and not upper and special:         charset = 'loweralphaspecialnum'
-        elif digit and lower and upper and not special:         charset = 'mixedalphanum'
-        else:                                                   charset = 'all'
+    def generate_stats_range(self, filename, start=0, end=None):
+        """ Generate password statistics for lines starting within the [start, end) byte range. """
 
-        return (pass_length, charset, simplemask_string, advancedmask_string, policy)
+        reader = WordlistReader(filename, start, end)
+        filesize = os.path.getsize(filename) if reader.seekable() else None
 
-    def generate_stats(self, filename):
-        """ Generate password statistics. """
+        batches = reader.batches()
+        while True:
+            read_start = time.time()
+            passwords = next(batches, None)
+            self.timings['read'] += time.time() - read_start
+
+            if passwords == None: break
+
+            self.update_stats(passwords)
+
+            if self.progress: self.print_progress(reader.position - reader.start, filesize)
+
+        self.bytes_counter += reader.position - reader.start
+
+    def update_stats(self, passwords):
+        """ Analyze a batch of passwords and update statistics. """
+
+        classify_start = time.time()
+
+        if self.counted:
+            (passwords, counts) = parse_counted(passwords)
+            self.total_counter += sum(counts)
+        else:
+            counts = itertools.repeat(1)
+            self.total_counter += len(passwords)
+
+        classes = self.classify_passwords(passwords)
+
+        if self.export:
+            self.export.write(self.analyze_classes, classes, counts if self.counted else None)
+
+        # Count identical character classes so that each of them is analyzed once
+        classes_counts = dict()
+        for (password_classes, count) in itertools.izip(classes, counts):
+            classes_counts[password_classes] = classes_counts.get(password_classes, 0) + count
+
+        analyses = [(self.analyze_classes(password_classes), count) for (password_classes, count) in classes_counts.iteritems()]
+
+        update_start = time.time()
+        self.timings['classify'] += update_start - classify_start
+
+        for (analysis, count) in analyses:
+            self.update_analysis(analysis, count)
+
+        self.timings['update'] += time.time() - update_start
+
+    def update_analysis(self, analysis, count=1):
+        """ Update statistics with an analyzed password occurring count times. """
 
-        with open(filename, 'r') as f:
+        (pass_length,characterset,simplemask,advancedmask, policy) = analysis
+        (digit,lower,upper,special) = policy
 
-            for password in f:
-                password = password.rstrip('\r\n')
+        if (self.charsets == None    or characterset in self.charsets) and \
+           (self.simplemasks == None or simplemask in self.simplemasks) and \
+           (self.maxlength == None   or pass_length <= self.maxlength) and \
+           (self.minlength == None   or pass_length >= self.minlength):
 
-                if len(password) == 0: continue
+            self.filter_counter += count
 
-                self.total_counter += 1  
+            if self.mindigit == None or digit < self.mindigit: self.mindigit = digit
+            if self.maxdigit == None or digit > self.maxdigit: self.maxdigit = digit
 
-                (pass_length,characterset,simplemask,advancedmask, policy) = self.analyze_password(password)
-                (digit,lower,upper,special) = policy
+            if self.minupper == None or upper < self.minupper: self.minupper = upper
+            if self.maxupper == None or upper > self.maxupper: self.maxupper = upper
 
-                if (self.charsets == None    or characterset in self.charsets) and \
-                   (self.simplemasks == None or simplemask in self.simplemasks) and \
-                   (self.maxlength == None   or pass_length <= self.maxlength) and \
-                   (self.minlength == None   or pass_length >= self.minlength):
+            if self.minlower == None or lower < self.minlower: self.minlower = lower
+            if self.maxlower == None or lower > self.maxlower: self.maxlower = lower
 
-                    self.filter_counter += 1
+            if self.minspecial == None or special < self.minspecial: self.minspecial = special
+            if self.maxspecial == None or special > self.maxspecial: self.maxspecial = special
 
-                    if self.mindigit == None or digit < self.mindigit: self.mindigit = digit
-                    if self.maxdigit == None or digit > self.maxdigit: self.maxdigit = digit
+            if pass_length in self.stats_length:
+                self.stats_length[pass_length] += count
+            else:
+                self.stats_length[pass_length] = count
+
+            if characterset in self.stats_charactersets:
+                self.stats_charactersets[characterset] += count
+            else:
+                self.stats_charactersets[characterset] = count
+
+            if simplemask in self.stats_simplemasks:
+                self.stats_simplemasks[simplemask] += count
+            else:
+                self.stats_simplemasks[simplemask] = count
+
+            if self.approx:
+                self.stats_advancedmasks.update(advancedmask, count)
+            elif advancedmask in self.stats_advancedmasks:
+                self.stats_advancedmasks[advancedmask] += count
+            else:
+                self.stats_advancedmasks[advancedmask] = count
+
+    def merge_stats(self, other):
+        """ Merge statistics collected by another StatsGen instance. """
+
+        self.total_counter += other.total_counter
+        self.filter_counter += other.filter_counter
+        self.bytes_counter += other.bytes_counter
+
+        for (stage, stage_time) in other.timings.iteritems():
+            self.timings[stage] += stage_time
+
+        for (stats, other_stats) in [(self.stats_length, other.stats_length),
+                                     (self.stats_charactersets, other.stats_charactersets),
+                                     (self.stats_simplemasks, other.stats_simplemasks),
+                                     (self.stats_advancedmasks, other.stats_advancedmasks)]:
+            if isinstance(other_stats, SpaceSaving):
+                # Exact counts become approximate once merged with a summary
+                if not isinstance(stats, SpaceSaving):
+                    summary = SpaceSaving(other.approx)
+                    for (key, count) in stats.iteritems():
+                        summary.update(key, count)
+                    stats = self.stats_advancedmasks = summary
+                    self.approx = other.approx
+
+                stats.merge(other_stats)
+                continue
+
+            for (key, count) in other_stats.iteritems():
+                if isinstance(stats, SpaceSaving):
+                    stats.update(key, count)
+                elif key in stats:
+                    stats[key] += count
+                else:
+                    stats[key] = count
+
+        for name in ['digit', 'upper', 'lower', 'special']:
+            other_min = getattr(other, 'min' + name)
+            other_max = getattr(other, 'max' + name)
+            self_min = getattr(self, 'min' + name)
+            self_max = getattr(self, 'max' + name)
+
+            if other_min != None and (self_min == None or other_min < self_min): setattr(self, 'min' + name, other_min)
+            if other_max != None and (self_max == None or other_max > self_max): setattr(self, 'max' + name, other_max)
+
+    def print_progress(self, position, filesize=None):
+        """ Print analysis progress at most every PROGRESS_INTERVAL seconds. """
+
+        now = time.time()
+        if now - self.progress_time < PROGRESS_INTERVAL: return
+        self.progress_time = now
+
+        elapsed = now - self.start_time
+        if elapsed <= 0: return
+
+        password_count = self.total_counter - self.start_counter
+        passwords_rate = password_count / elapsed
+        bytes_rate = position / elapsed
+
+        if filesize and bytes_rate:
+            eta = str(datetime.timedelta(seconds=int((filesize - position) / bytes_rate)))
+            print "[*] Processed %d passwords (%d%%) at %d p/sec, %.2f MB/sec, ETA %s" % \
+                (password_count, position*100/filesize, passwords_rate, bytes_rate/1024/1024, eta)
+        else:
+            print "[*] Processed %d passwords at %d p/sec, %.2f MB/sec" % \
+                (password_count, passwords_rate, bytes_rate/1024/1024)
+
+    def print_profile(self):
+        """ Print analysis throughput and the time spent in each stage. """
+
+        analysis_time = max(self.analysis_time, 0.001)
+        password_count = self.total_counter - self.start_counter
+
+        print "[*] Finished analyzing %d passwords (%.2f MB) in %.2f seconds at %d p/sec, %.2f MB/sec" % \
+            (password_count, self.bytes_counter/1024.0/1024, self.analysis_time,
+             password_count/analysis_time, self.bytes_counter/analysis_time/1024/1024)
+
+        stages_time = max(sum(self.timings.values()), 0.001)
+        print "    Time split: read %.2fs (%d%%), classify %.2fs (%d%%), update %.2fs (%d%%)" % \
+            (self.timings['read'], self.timings['read']*100/stages_time,
+             self.timings['classify'], self.timings['classify']*100/stages_time,
+             self.timings['update'], self.timings['update']*100/stages_time)
+
+    def save_profile(self, filename):
+        """ Save a machine-readable summary of the analysis throughput and timings. """
+
+        analysis_time = max(self.analysis_time, 0.001)
+        password_count = self.total_counter - self.start_counter
+
+        profile = dict()
+        profile['passwords'] = password_count
+        profile['bytes'] = self.bytes_counter
+        profile['threads'] = self.threads
+        profile['wall_time'] = self.analysis_time
+        profile['passwords_per_second'] = password_count / analysis_time
+        profile['bytes_per_second'] = self.bytes_counter / analysis_time
+        profile['stage_times'] = self.timings
+
+        with open(filename, 'w') as f:
+            json.dump(profile, f, indent=4, sort_keys=True)
+            f.write("\n")
+
+    def save_snapshot(self, filename):
+        """ Save a compact binary snapshot of the collected statistics. """
+
+        policy = [getattr(self, minmax + name) for name in ['digit', 'upper', 'lower', 'special'] for minmax in ['min', 'max']]
+
+        payload = [struct.pack("<QQ8qQ", self.total_counter, self.filter_counter, *([-1 if x == None else x for x in policy] + [self.approx or 0]))]
+
+        sections = [dict((str(length), count) for (length, count) in self.stats_length.iteritems()),
+                    self.stats_charactersets, self.stats_simplemasks, self.stats_advancedmasks]
+
+        # Overestimation of approximately counted advanced masks
+        if self.approx: sections.append(self.stats_advancedmasks.errors)
+
+        for stats in sections:
+            payload.append(struct.pack("<I", len(stats)))
+            for (key, count) in stats.iteritems():
+                payload.append(struct.pack("<I", len(key)) + key + struct.pack("<Q", count))
+
+        with open(filename, 'wb') as f:
+            f.write(struct.pack("<8sB", SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+            f.write(zlib.compress(''.join(payload)))
+
+    def load_snapshot(self, filename):
+        """ Load a statistics snapshot and merge it with the current statistics. """
+
+        with open(filename, 'rb') as f:
+            data = f.read()
+
+        (magic, version) = struct.unpack_from("<8sB", data) if len(data) >= 9 else (None, None)
+        if magic != SNAPSHOT_MAGIC or not version in [1, SNAPSHOT_VERSION]:
+            print "[!] Error, [%s] is not a StatsGen snapshot." % filename
+            return False
+
+        data = zlib.decompress(data[9:])
 
-                    if self.minupper == None or upper < self.minupper: self.minupper = upper
-                    if self.maxupper == None or upper > self.maxupper: self.maxupper = upper
+        # Version 1 snapshots only contain exact counts
+        counters_format = "<QQ8q" if version == 1 else "<QQ8qQ"
 
-                    if self.minlower == None or lower < self.minlower: self.minlower = lower
-                    if self.maxlower == None or lower > self.maxlower: self.maxlower = lower
+        snapshot = StatsGen()
+        counters = struct.unpack_from(counters_format, data)
+        (snapshot.total_counter, snapshot.filter_counter) = counters[:2]
 
-                    if self.minspecial == None or special < self.minspecial: self.minspecial = special
-                    if self.maxspecial == None or special > self.maxspecial: self.maxspecial = special
+        policy = [None if x == -1 else x for x in counters[2:10]]
+        (snapshot.mindigit, snapshot.maxdigit, snapshot.minupper, snapshot.maxupper,
+         snapshot.minlower, snapshot.maxlower, snapshot.minspecial, snapshot.maxspecial) = policy
 
-                    if pass_length in self.stats_length:
-                        self.stats_length[pass_length] += 1
-                    else:
-                        self.stats_length[pass_length] = 1
+        sections = [snapshot.stats_length, snapshot.stats_charactersets, snapshot.stats_simplemasks, snapshot.stats_advancedmasks]
 
-                    if characterset in self.stats_charactersets:
-                        self.stats_charactersets[characterset] += 1
-                    else:
-                        self.stats_charactersets[characterset] = 1
+        approx = counters[10] if version > 1 else 0
+        if approx: sections.append(dict())
 
-                    if simplemask in self.stats_simplemasks:
-                        self.stats_simplemasks[simplemask] += 1
-                    else:
-                        self.stats_simplemasks[simplemask] = 1
+        offset = struct.calcsize(counters_format)
+        for stats in sections:
+            (entries,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            for i in xrange(entries):
+                (key_length,) = struct.unpack_from("<I", data, offset)
+                key = data[offset+4:offset+4+key_length]
+                (count,) = struct.unpack_from("<Q", data, offset+4+key_length)
+                offset += key_length + 12
 
-                    if advancedmask in self.stats_advancedmasks:
-                        self.stats_advancedmasks[advancedmask] += 1
-                    else:
-                        self.stats_advancedmasks[advancedmask] = 1
+                stats[key] = count
+
+        snapshot.stats_length = dict((int(length), count) for (length, count) in snapshot.stats_length.iteritems())
+
+        if approx:
+            snapshot.approx = approx
+            summary = SpaceSaving(approx)
+            summary.restore(snapshot.stats_advancedmasks, sections[-1])
+            snapshot.stats_advancedmasks = summary
+
+        self.merge_stats(snapshot)
+        return True
 
     def print_stats(self):
         """ Print password statistics. """
@@ -199,6 +727,8 @@ class StatsGen:
             print "[+] %25s: %02d%% (%d)" % (simplemask, count*100/self.filter_counter, count)
 
         print "\n[*] Advanced Masks:"
+        if self.approx:
+            print "    NOTE: Tracking %d most frequent masks, counts below may be overestimated by up to %d" % (self.approx, self.stats_advancedmasks.max_error())
         for (advancedmask,count) in sorted(self.stats_advancedmasks.iteritems(), key=operator.itemgetter(1), reverse=True):
             if count*100/self.filter_counter > 0:
                 print "[+] %25s: %02d%% (%d)" % (advancedmask, count*100/self.filter_counter, count)
@@ -206,6 +736,96 @@ class StatsGen:
             if self.output_file:
                 self.output_file.write("%s,%d\n" % (advancedmask,count))
 
+def analyze_class_string(password_classes):
+    """ Return length, character-set, simple mask, advanced mask and policy of
+    a character class string. """
+
+    # Password length
+    pass_length = len(password_classes)
+
+    # Policy
+    digit   = password_classes.count('d')
+    lower   = password_classes.count('l')
+    upper   = password_classes.count('u')
+    special = pass_length - digit - lower - upper
+    policy = (digit,lower,upper,special)
+
+    # String representation of masks
+    advancedmask_string = '?' + '?'.join(password_classes) if password_classes else ''
+
+    # Only up to three runs of digits, strings and specials have a simple mask
+    rest = password_classes.translate(SIMPLE_TABLE)
+    first = rest[:1]
+    rest = rest.lstrip(first)
+    second = rest[:1]
+    rest = rest.lstrip(second)
+    third = rest[:1]
+    if rest.lstrip(third): simplemask_string = 'othermask'
+    else:                  simplemask_string = SIMPLEMASKS[first + second + third]
+
+    # Determine character-set
+    charset = CHARSETS[(digit > 0, lower > 0, upper > 0, special > 0)]
+
+    return (pass_length, charset, simplemask_string, advancedmask_string, policy)
+
+def npy_header(descr, rows):
+    """ Return a NumPy .npy format header for a one-dimensional array. """
+
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (descr, rows)
+    header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + "\n"
+
+    return "\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header
+
+def parse_counted(lines):
+    """ Split pre-counted "count password" lines into passwords and counts. """
+
+    passwords = list()
+    counts = list()
+
+    for line in lines:
+        match = COUNTED_LINE.match(line)
+        if not match: continue
+
+        password = decode_hex(match.group(2))
+        if len(password) == 0: continue
+
+        passwords.append(password)
+        counts.append(int(match.group(1)))
+
+    return (passwords, counts)
+
+def worker_statsgen(settings):
+    """ Create a StatsGen instance for a worker process. """
+
+    statsgen = StatsGen()
+    for (name, value) in settings.iteritems():
+        setattr(statsgen, name, value)
+
+    if statsgen.approx:
+        statsgen.stats_advancedmasks = SpaceSaving(statsgen.approx)
+
+    return statsgen
+
+def stats_worker(args):
+    """ Analyze a byte range of the passwords file in a worker process. """
+
+    (settings, filename, start, end) = args
+
+    statsgen = worker_statsgen(settings)
+    statsgen.generate_stats_range(filename, start, end)
+
+    return statsgen
+
+def stats_batch_worker(args):
+    """ Analyze a batch of passwords in a worker process. """
+
+    (settings, passwords) = args
+
+    statsgen = worker_statsgen(settings)
+    statsgen.update_stats(passwords)
+
+    return statsgen
+
 if __name__ == "__main__":
 
     header  = "                       _ \n"
@@ -218,7 +838,7 @@ if __name__ == "__main__":
     header += "     |_| iphelix@thesprawl.org\n"
     header += "\n"
 
-    parser = OptionParser("%prog [options] passwords.txt\n\nType --help for more options", version="%prog "+VERSION)
+    parser = OptionParser("%prog [options] passwords.txt|passwords.txt.gz|-\n       %prog [options] --merge pass0.stats [pass1.stats ...]\n\nType --help for more options", version="%prog "+VERSION)
 
     filters = OptionGroup(parser, "Password Filters")
     filters.add_option("--minlength", dest="minlength", type="int", metavar="8", help="Minimum password length")
@@ -229,6 +849,21 @@ if __name__ == "__main__":
 
     parser.add_option("-o", "--output", dest="output_file",help="Save masks and stats to a file", metavar="password.masks")
     parser.add_option("--hiderare", action="store_true", dest="hiderare", default=False, help="Hide statistics covering less than 1% of the sample")
+    parser.add_option("--threads", dest="threads", type="int", default=1, metavar="8", help="Parallel processes to use for analysis")
+    parser.add_option("--counted", action="store_true", dest="counted", default=False, help="Passwords are prefixed with their counts (e.g. uniq -c output)")
+    parser.add_option("--export", dest="export_file", help="Save per-password features to a NumPy .npz file", metavar="password.npz")
+    parser.add_option("--approx", dest="approx", type="int", metavar="100000", help="Approximately count advanced masks keeping only the N most frequent ones in memory")
+
+    snapshots = OptionGroup(parser, "Statistics Snapshots")
+    snapshots.add_option("--snapshot", dest="snapshot_file", help="Save statistics snapshot to a file", metavar="password.stats")
+    snapshots.add_option("--update", dest="update_file", help="Add analyzed passwords to statistics saved in a snapshot (created if missing)", metavar="password.stats")
+    snapshots.add_option("--merge", action="store_true", dest="merge", default=False, help="Merge statistics snapshots given as arguments instead of analyzing passwords")
+    parser.add_option_group(snapshots)
+
+    profiling = OptionGroup(parser, "Progress and Profiling")
+    profiling.add_option("--progress", action="store_true", dest="progress", default=False, help="Report analysis progress, throughput and ETA")
+    profiling.add_option("--profile", dest="profile_file", help="Save JSON summary of throughput and time spent in each stage", metavar="profile.json")
+    parser.add_option_group(profiling)
 
     parser.add_option("-q", "--quiet", action="store_true", dest="quiet", default=False, help="Don't show headers.")
     (options, args) = parser.parse_args()
@@ -237,11 +872,13 @@ if __name__ == "__main__":
     if not options.quiet:
         print header
 
-    if len(args) != 1:
-        parser.error("no passwords file specified")
+    if options.merge and len(args) < 1:
+        parser.error("no snapshot files specified")
         exit(1)
 
-    print "[*] Analyzing passwords in [%s]" % args[0]
+    elif not options.merge and len(args) != 1:
+        parser.error("no passwords file specified")
+        exit(1)
 
     statsgen = StatsGen()
 
@@ -251,10 +888,56 @@ if __name__ == "__main__":
     if not options.simplemasks == None: statsgen.simplemasks = [x.strip() for x in options.simplemasks.split(',')]
 
     if options.hiderare: statsgen.hiderare = options.hiderare
+    if options.threads:  statsgen.threads  = options.threads
+    if options.counted:  statsgen.counted  = options.counted
+    if options.progress: statsgen.progress = options.progress
+
+    if options.approx:
+        statsgen.approx = options.approx
+        statsgen.stats_advancedmasks = SpaceSaving(options.approx)
+
+    if options.export_file:
+        statsgen.export = FeatureExport(options.export_file, statsgen.counted)
+
+        # Rows must be written in the input order
+        if statsgen.threads > 1:
+            print "[!] Exporting features requires a single process, ignoring --threads."
+            statsgen.threads = 1
 
     if options.output_file:
         print "[*] Saving advanced masks and occurrences to [%s]" % options.output_file
         statsgen.output_file = open(options.output_file, 'w')
 
-    statsgen.generate_stats(args[0])
+    # Continue from the previously saved state
+    if options.update_file and os.path.exists(options.update_file):
+        print "[*] Updating statistics snapshot [%s]" % options.update_file
+        if not statsgen.load_snapshot(options.update_file): exit(1)
+
+    if options.merge:
+        for arg in args:
+            print "[*] Merging statistics snapshot [%s]" % arg
+            if not statsgen.load_snapshot(arg): exit(1)
+    else:
+        print "[*] Analyzing passwords in [%s]" % args[0]
+        statsgen.generate_stats(args[0])
+
+        if statsgen.export:
+            print "[*] Saving per-password features to [%s]" % options.export_file
+            statsgen.export.close()
+
+        if options.progress or options.profile_file:
+            statsgen.print_profile()
+
+        if options.profile_file:
+            print "[*] Saving timing summary to [%s]" % options.profile_file
+            statsgen.save_profile(options.profile_file)
+
+    if options.snapshot_file:
+        print "[*] Saving statistics snapshot to [%s]" % options.snapshot_file
+        statsgen.save_snapshot(options.snapshot_file)
+
+    if options.update_file:
+        print "[*] Saving updated statistics snapshot to [%s]" % options.update_file
+        statsgen.save_snapshot(options.update_file)
+
     statsgen.print_stats()
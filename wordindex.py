@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# WordIndex - Candidate source word index
+#
+# This tool is part of PACK (Password Analysis and Cracking Kit)
+#
+# VERSION 0.0.3
+#
+# Copyright (C) 2013 Peter Kacherginsky
+# All rights reserved.
+#
+# Please see the attached LICENSE file for additional licensing information.
+
+import os
+import mmap
+import struct
+import zlib
+import itertools
+import heapq
+import array, tempfile, shutil
+
+from wordlist import WordlistReader
+
+INDEX_MAGIC = "PACKWIDX"
+INDEX_VERSION = 1
+
+# Magic, version, maximum distance, prefix length, number of words and keys
+INDEX_HEADER = struct.Struct('<8sBBBxIQ')
+
+# Only deletes within the first characters of each word are indexed
+INDEX_PREFIX_LENGTH = 7
+
+# Number of keys or offsets packed at once when saving the index
+INDEX_WRITE_SIZE = 100000
+
+# Number of keys sorted in memory at once. Larger wordlists are sorted in
+# several runs which are merged into the index.
+INDEX_SORT_SIZE = 4000000
+
+# Number of keys read at once from each of the sorted runs while merging
+INDEX_MERGE_SIZE = 10000
+
+class WordIndexProvider:
+    """ Provider description compatible with Enchant dictionaries. """
+    name = "wordindex"
+
+class WordIndex:
+    """ Symmetric delete (SymSpell) index of a wordlist.
+
+    Every word is indexed under all of the strings obtained by deleting up to
+    max_distance characters from its prefix. Words within max_distance of a
+    password share at least one of these deletes with the password, so
+    suggestions only require a lookup of the password deletes followed by
+    an exact distance check.
+
+    The index is saved next to the wordlist and memory-mapped. It consists
+    of a sorted array of 64-bit keys, each made of a 32-bit delete hash and
+    a word id, followed by word offsets, word frequencies and the words.
+    """
+
+    provider = WordIndexProvider()
+
+    def __init__(self, filename):
+        self.filename = filename
+
+        self.f = open(filename, 'rb')
+        self.data = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.max_distance, self.prefix_length, self.word_count, self.key_count) = INDEX_HEADER.unpack_from(self.data, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise IOError("%s is not a word index" % filename)
+
+        self.keys_offset = INDEX_HEADER.size
+        self.words_offset = self.keys_offset + 8 * self.key_count
+        self.frequencies_offset = self.words_offset + 8 * (self.word_count + 1)
+        self.blob_offset = self.frequencies_offset + 4 * self.word_count
+
+    def key(self, i):
+        return struct.unpack_from('<Q', self.data, self.keys_offset + 8 * i)[0]
+
+    def word(self, word_id):
+        (start, end) = struct.unpack_from('<QQ', self.data, self.words_offset + 8 * word_id)
+        return self.data[self.blob_offset + start:self.blob_offset + end]
+
+    def frequency(self, word_id):
+        return struct.unpack_from('<I', self.data, self.frequencies_offset + 4 * word_id)[0]
+
+    def lookup(self, delete):
+        """ Return ids of words indexed under a delete. """
+
+        delete_hash = zlib.crc32(delete) & 0xffffffff
+
+        # Binary search for the first key with the delete hash
+        low = 0
+        high = self.key_count
+        while low < high:
+            middle = (low + high) / 2
+            if self.key(middle) >> 32 < delete_hash: low = middle + 1
+            else: high = middle
+
+        word_ids = list()
+        while low < self.key_count:
+            key = self.key(low)
+            if key >> 32 != delete_hash: break
+            word_ids.append(key & 0xffffffff)
+            low += 1
+
+        return word_ids
+
+    def candidates(self, word):
+        """ Return ids of words sharing a delete with the word. """
+
+        word_ids = set()
+        for delete in getdeletes(word[:self.prefix_length], self.max_distance):
+            word_ids.update(self.lookup(delete))
+
+        return word_ids
+
+    def suggest(self, password):
+        """ Return words within the maximum distance of a password ranked by
+        distance and frequency. """
+
+        word_ids = list(self.candidates(password))
+        words = [self.word(word_id) for word_id in word_ids]
+
+        suggestions = list()
+        for (word_id, word, distance) in itertools.izip(word_ids, words, levenshtein_distances(password, words)):
+            if distance <= self.max_distance:
+                suggestions.append((distance, -self.frequency(word_id), word))
+
+        return [word for (distance, frequency, word) in sorted(suggestions)]
+
+    def check(self, word):
+        """ Check whether a word is in the index. """
+        return any([self.word(word_id) == word for word_id in self.lookup(word[:self.prefix_length])])
+
+def getdeletes(word, distance):
+    """ Return all strings obtained by deleting up to distance characters. """
+
+    deletes = set([word])
+    edits = [word]
+    for i in xrange(distance):
+        next_edits = list()
+        for edit in edits:
+            for j in xrange(len(edit)):
+                delete = edit[:j] + edit[j+1:]
+                if not delete in deletes:
+                    deletes.add(delete)
+                    next_edits.append(delete)
+        edits = next_edits
+
+    return deletes
+
+def build_index(wordlist_file, index_file, distance, prefix_length=INDEX_PREFIX_LENGTH):
+    """ Build a word index of a wordlist. Words are numbered in the order of
+    their first appearance and their frequency is the number of times they
+    appear in the wordlist.
+
+    Words are streamed to a temporary file, while their keys are sorted in
+    runs of INDEX_SORT_SIZE keys saved next to the index and merged at the
+    end, so only a single run of keys is kept in memory. """
+
+    word_ids = dict()
+    offsets = array.array('L', [0])
+    frequencies = array.array('L')
+
+    tempdir = tempfile.mkdtemp(prefix='wordindex', dir=os.path.dirname(os.path.abspath(index_file)))
+    try:
+        words_file = open(os.path.join(tempdir, 'words'), 'wb')
+
+        runs = list()
+        keys = list()
+        key_count = 0
+
+        for word in WordlistReader(wordlist_file):
+            word_id = word_ids.get(word)
+            if word_id != None:
+                frequencies[word_id] += 1
+                continue
+
+            word_id = word_ids[word] = len(frequencies)
+            frequencies.append(1)
+
+            words_file.write(word)
+            offsets.append(offsets[-1] + len(word))
+
+            for delete in getdeletes(word[:prefix_length], distance):
+                keys.append((zlib.crc32(delete) & 0xffffffff) << 32 | word_id)
+
+            if len(keys) >= INDEX_SORT_SIZE:
+                key_count += len(keys)
+                runs.append(save_run(keys, os.path.join(tempdir, 'run%d' % len(runs))))
+                keys = list()
+
+        words_file.close()
+        del word_ids
+
+        key_count += len(keys)
+        if runs:
+            runs.append(save_run(keys, os.path.join(tempdir, 'run%d' % len(runs))))
+            keys = heapq.merge(*[read_run(run) for run in runs])
+        else:
+            keys.sort()
+
+        with open(index_file, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, distance, prefix_length, len(frequencies), key_count))
+
+            write_packed(f, 'Q', keys)
+            del keys
+
+            write_packed(f, 'Q', offsets)
+            write_packed(f, 'I', (min(frequency, 0xffffffff) for frequency in frequencies))
+
+            with open(os.path.join(tempdir, 'words'), 'rb') as words_file:
+                shutil.copyfileobj(words_file, f)
+
+    finally:
+        shutil.rmtree(tempdir)
+
+def save_run(keys, filename):
+    """ Sort keys and save them to a run file. """
+
+    keys.sort()
+    with open(filename, 'wb') as f:
+        write_packed(f, 'Q', keys)
+
+    return filename
+
+def read_run(filename):
+    """ Yield sorted keys from a run file. """
+
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(8 * INDEX_MERGE_SIZE)
+            if not block: break
+
+            for key in struct.unpack('<%dQ' % (len(block) / 8), block):
+                yield key
+
+def write_packed(f, typecode, values):
+    """ Pack values in little-endian chunks of INDEX_WRITE_SIZE and write them to a file. """
+
+    values = iter(values)
+    while True:
+        chunk = list(itertools.islice(values, INDEX_WRITE_SIZE))
+        if not chunk: break
+        f.write(struct.pack('<%d%s' % (len(chunk), typecode), *chunk))
+
+def load_index(wordlist_file, distance):
+    """ Return the word index of a wordlist, building it first if it is
+    missing, older than the wordlist or built for another distance. """
+
+    index_file = "%s.index" % wordlist_file
+
+    if os.path.exists(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(wordlist_file):
+        try:
+            index = WordIndex(index_file)
+            if index.max_distance == distance:
+                return index
+        except IOError:
+            pass
+
+    print "[*] Building word index [%s]" % index_file
+    build_index(wordlist_file, index_file, distance)
+
+    return WordIndex(index_file)
+
+def levenshtein_distances(password, words):
+    """ Calculate Levenshtein distances between a password and each of the
+    words using the bit-parallel algorithm by Myers in the formulation by
+    Hyyro. Each bit of the vertical deltas corresponds to a character of the
+    password, and the table of password character positions is built only
+    once for all of the words. """
+
+    if not password:
+        return [len(word) for word in words]
+
+    # Positions of each character in the password
+    peq = dict()
+    for (i, c) in enumerate(password):
+        peq[c] = peq.get(c, 0) | (1 << i)
+
+    mask = (1 << len(password)) - 1
+    last = 1 << (len(password) - 1)
+
+    distances = list()
+    for word in words:
+        vp = mask
+        vn = 0
+        distance = len(password)
+
+        for c in word:
+            eq = peq.get(c, 0)
+            xv = eq | vn
+            xh = (((eq & vp) + vp) ^ vp) | eq
+            hp = vn | (~(xh | vp) & mask)
+            hn = vp & xh
+
+            if hp & last:   distance += 1
+            elif hn & last: distance -= 1
+
+            hp = ((hp << 1) | 1) & mask
+            hn = (hn << 1) & mask
+            vp = hn | (~(xv | hp) & mask)
+            vn = hp & xv
+
+        distances.append(distance)
+
+    return distances
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# Wordlist - Memory-mapped password list reader
+#
+# This tool is part of PACK (Password Analysis and Cracking Kit)
+#
+# VERSION 0.0.3
+#
+# Copyright (C) 2013 Peter Kacherginsky
+# All rights reserved.
+#
+# Please see the attached LICENSE file for additional licensing information.
+
+import sys, os
+import mmap
+import binascii
+import gzip, bz2
+import subprocess
+import threading, Queue
+
+# Number of bytes sliced out of the memory map or read from a stream at once
+BLOCK_SIZE = 4*1024*1024
+
+# Number of blocks decompressed ahead of the analysis
+PREFETCH_BLOCKS = 4
+
+# External decompressors for formats without Python 2 standard library support
+DECOMPRESSORS = dict()
+DECOMPRESSORS['.xz']  = ['xz', '-dc']
+DECOMPRESSORS['.zst'] = ['zstd', '-dc']
+
+class WordlistReader:
+    """ Read passwords from a memory-mapped wordlist.
+
+    The file is sliced into large blocks which are split into passwords with
+    a single call, so there is no per-line read or rstrip. Trailing carriage
+    returns and empty lines are removed and $HEX[...] entries are decoded.
+
+    Only the passwords starting within the [start, end) byte range are read,
+    so that several readers can share a single file. Once reading begins,
+    start is moved past the partial line which belongs to the previous range.
+
+    Standard input ('-') and .gz, .bz2, .xz and .zst files are streamed
+    instead. Blocks are read and decompressed in a separate thread (or an
+    external decompressor process) ahead of the analysis.
+    """
+
+    def __init__(self, filename, start=0, end=None):
+        self.filename = filename
+        self.start = start
+        self.end = end
+
+        # Number of bytes consumed so far
+        self.position = start
+
+    def __iter__(self):
+        for passwords in self.batches():
+            for password in passwords:
+                yield password
+
+    def seekable(self):
+        """ Check whether the wordlist is a plain file which can be memory-mapped. """
+
+        if self.filename == '-': return False
+
+        extension = os.path.splitext(self.filename)[1].lower()
+        return not extension in ['.gz', '.bz2'] + DECOMPRESSORS.keys()
+
+    def batches(self):
+        """ Yield lists of passwords, one list per block. """
+
+        if self.seekable():
+            return self.mmap_batches()
+        else:
+            return self.stream_batches()
+
+    def mmap_batches(self):
+        """ Yield lists of passwords from the memory-mapped file. """
+
+        with open(self.filename, 'rb') as f:
+            filesize = os.fstat(f.fileno()).st_size
+            end = filesize if self.end == None else min(self.end, filesize)
+
+            # Empty files can not be memory-mapped
+            if self.start >= end: return
+
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                # Skip the partial line which belongs to the previous range
+                start = self.start
+                if start > 0 and data[start-1] != '\n':
+                    start = data.find('\n', start) + 1 or filesize
+
+                # Bytes of the range are counted from its first full line
+                self.start = self.position = start
+
+                # Finish the last line which starts within the range
+                end = data.find('\n', end-1) + 1 or filesize
+
+                while start < end:
+                    block_end = data.find('\n', min(start + BLOCK_SIZE, end) - 1) + 1 or filesize
+                    block = data[start:block_end]
+
+                    self.position = start = block_end
+
+                    yield split_passwords(block)
+            finally:
+                data.close()
+
+    def stream_batches(self):
+        """ Yield lists of passwords from the standard input or a compressed file. """
+
+        if self.filename == '-':
+            stream = sys.stdin
+            process = None
+
+        else:
+            extension = os.path.splitext(self.filename)[1].lower()
+            if extension in DECOMPRESSORS:
+                process = subprocess.Popen(DECOMPRESSORS[extension] + [self.filename], stdout=subprocess.PIPE)
+                stream = process.stdout
+            else:
+                stream = gzip.open(self.filename, 'rb') if extension == '.gz' else bz2.BZ2File(self.filename, 'rb')
+                process = None
+
+        blocks = Queue.Queue(PREFETCH_BLOCKS)
+        reader = threading.Thread(target=read_blocks, args=(stream, blocks))
+        reader.daemon = True
+        reader.start()
+
+        remainder = ''
+        try:
+            while True:
+                block = blocks.get()
+
+                # Reader finished or failed
+                if block == None: break
+                if isinstance(block, Exception): raise block
+
+                self.position += len(block)
+
+                # Keep the last incomplete line for the next block
+                block = remainder + block
+                block_end = block.rfind('\n') + 1
+                remainder = block[block_end:]
+
+                if block_end: yield split_passwords(block[:block_end])
+
+            if remainder: yield split_passwords(remainder)
+
+        finally:
+            if not stream is sys.stdin: stream.close()
+            if process: process.wait()
+
+        if process and process.returncode != 0:
+            raise IOError("%s failed to decompress %s" % (DECOMPRESSORS[extension][0], self.filename))
+
+def read_blocks(stream, blocks):
+    """ Read (and decompress) blocks from a stream into a queue. """
+
+    try:
+        while True:
+            block = stream.read(BLOCK_SIZE)
+            if not block: break
+            blocks.put(block)
+    except Exception, e:
+        blocks.put(e)
+    else:
+        blocks.put(None)
+
+def split_passwords(block):
+    """ Split a block of lines into passwords. Trailing carriage returns are
+    removed, hex encoded passwords are decoded and empty lines are skipped. """
+
+    passwords = block.split('\n')
+
+    if '\r' in block:
+        passwords = [password.rstrip('\r') for password in passwords]
+
+    if '$HEX[' in block:
+        passwords = [decode_hex(password) for password in passwords]
+
+    return filter(None, passwords)
+
+def decode_hex(password):
+    """ Decode passwords in the $HEX[...] format. """
+
+    if password.startswith('$HEX[') and password.endswith(']'):
+        try:
+            return binascii.unhexlify(password[5:-1])
+        except TypeError:
+            pass
+
+    return password